@@ -0,0 +1 @@
+# app2/benchmarks/__init__.py
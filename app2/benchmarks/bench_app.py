@@ -0,0 +1,222 @@
+# app2/benchmarks/bench_app.py
+#
+# End-to-end benchmark of the real FastAPI app, driven in-process through
+# httpx.ASGITransport, with QuickBooks served by qb_emulator and NHTSA by a
+# local stand-in, both adding a configurable latency. Reports throughput, p50/p95/p99 and
+# upstream calls per request for each scenario, and saves the run as JSON.
+#
+# Run from app2/:
+#   python -m benchmarks.bench_app --latency-ms 80 --concurrency 16 --requests 400
+#   python -m benchmarks.bench_app --scenarios locksmith,vehicle --compare benchmarks/results/<earlier>.json
+
+import os
+import tempfile
+
+# Settings are read at import time, so configure the app before importing it
+_TMP = tempfile.mkdtemp(prefix="pk-bench-")
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+os.environ.setdefault("VIN_CACHE_PATH", os.path.join(_TMP, "vin_cache.sqlite3"))
+os.environ.setdefault("STATIC_PRECOMPRESS", "false")
+# The emulator enforces no quota; export the real values to include limiter waits
+os.environ.setdefault("QB_RATE_LIMIT_PER_MINUTE", "1000000")
+os.environ.setdefault("QB_MAX_CONCURRENT_REQUESTS", "1000")
+
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+import httpx
+
+from benchmarks.stubs import Upstreams
+from qb_emulator import EmulatorConfig, create_app
+from main import app
+from utils import http_clients
+from utils.session import customer_key, session_store
+from utils.tokens import create_access_token
+from utils.vin_decoder import compute_check_digit
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+REALM_ID = "bench-realm"
+CSRF_TOKEN = "bench-csrf"
+
+
+def make_vins(count: int) -> list[str]:
+    vins = []
+    for i in range(count):
+        vin = f"1HGCM826X3A{i:06d}"
+        vins.append(vin[:8] + compute_check_digit(vin) + vin[9:])
+    return vins
+
+
+def scenario_request(name: str, i: int, vins: list[str]) -> tuple[str, str, dict | None]:
+    vin = vins[i % len(vins)]
+    if name == "locksmith":
+        return "POST", "/api/jobs/locksmith", {"vin": vin, "service": "Generate Smart Key", "Qty": 1, "UnitPrice": 150}
+    if name == "customers":
+        return "GET", "/api/qb/customers", None
+    if name == "items":
+        return "GET", "/api/qb/items", None
+    if name == "vehicle":
+        return "GET", f"/api/vehicles/{vin}", None
+    raise ValueError(f"Unknown scenario '{name}'")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def make_client(transport: httpx.ASGITransport, worker: int, customer_ids: list[str]) -> httpx.AsyncClient:
+    session_id = f"bench-{worker}"
+    # Each worker is a technician working on its own customer
+    session_store.set(customer_key(session_id), customer_ids[worker % len(customer_ids)])
+    return httpx.AsyncClient(
+        transport=transport,
+        base_url="http://bench",
+        cookies={
+            "jwt_token": create_access_token({"sub": "leeno@pk.com"}),
+            "qb_access_token": "bench-token",
+            "qb_realm_id": REALM_ID,
+            "session_id": session_id,
+            "csrf_token": CSRF_TOKEN,
+        },
+        headers={"x-csrf-token": CSRF_TOKEN, "accept-encoding": "gzip"},
+    )
+
+
+async def run_scenario(name: str, args, upstreams: Upstreams, emulator, clients: list[httpx.AsyncClient], vins: list[str]) -> dict:
+    counter = 0
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker(client: httpx.AsyncClient, total: int, record: bool):
+        nonlocal counter, errors
+        while counter < total:
+            i = counter
+            counter += 1
+            method, url, body = scenario_request(name, i, vins)
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            elapsed = time.perf_counter() - started
+            if record:
+                latencies.append(elapsed * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+    # Warm-up fills caches the way a running server would have them
+    await asyncio.gather(*(worker(c, args.warmup, False) for c in clients))
+    counter = 0
+    upstreams.reset_counts()
+    emulator.calls.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(c, args.requests, True) for c in clients))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    calls = upstreams.calls + Counter({f"qb.{op}": n for op, n in emulator.calls.items()})
+    upstream_calls = sum(calls.values())
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "upstream_calls_per_request": round(upstream_calls / len(latencies), 3) if latencies else 0.0,
+        "upstream_calls": dict(calls),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: dict, baseline: dict | None):
+    header = f"{'scenario':<12}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'upstream/req':>14}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<12}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+            f"{r['errors']:>8}{r['upstream_calls_per_request']:>14}"
+        )
+        if baseline and name in baseline:
+            b = baseline[name]
+            deltas = []
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "upstream_calls_per_request"):
+                if b.get(key):
+                    deltas.append(f"{key} {100 * (r[key] - b[key]) / b[key]:+.1f}%")
+            print(f"{'':<12}vs baseline: {', '.join(deltas)}")
+
+
+async def main_async(args) -> dict:
+    upstreams = Upstreams(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    qb_app = create_app(EmulatorConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, customers=args.customers))
+    emulator = qb_app.state.emulator
+    qb_transport = httpx.ASGITransport(app=qb_app)
+    http_clients._clients[http_clients.QB_API] = httpx.AsyncClient(transport=qb_transport)
+    http_clients._clients[http_clients.QB_OAUTH] = httpx.AsyncClient(transport=qb_transport)
+    http_clients._clients[http_clients.NHTSA] = httpx.AsyncClient(transport=httpx.MockTransport(upstreams.nhtsa))
+
+    customer_ids = [row["Id"] for row in emulator.company(REALM_ID).rows("Customer")]
+    transport = httpx.ASGITransport(app=app)
+    clients = [make_client(transport, worker, customer_ids) for worker in range(args.concurrency)]
+    vins = make_vins(args.vins)
+
+    results = {}
+    try:
+        for name in args.scenarios.split(","):
+            results[name] = await run_scenario(name.strip(), args, upstreams, emulator, clients, vins)
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+        await http_clients.close_http_clients()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process benchmark of the Patriotic Keys API")
+    parser.add_argument("--scenarios", default="locksmith,customers,items,vehicle")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="added to every upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--vins", type=int, default=50, help="distinct VINs cycled through")
+    parser.add_argument("--output", type=Path, help="JSON results file (default: benchmarks/results/app-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    baseline = json.loads(args.compare.read_text())["results"] if args.compare else None
+    print_table(results, baseline)
+
+    output = args.output or RESULTS_DIR / f"app-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "config": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "results": results,
+    }, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
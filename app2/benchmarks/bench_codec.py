@@ -0,0 +1,104 @@
+# app2/benchmarks/bench_codec.py
+#
+# Micro-benchmark for utils.codec against the stdlib paths it replaced.
+# Run from app2/:  python -m benchmarks.bench_codec [--repeat N]
+
+import argparse
+import json
+import timeit
+import httpx
+from fastapi.responses import JSONResponse
+from utils import codec
+
+
+def make_customer(i: int) -> dict:
+    return {
+        "Id": str(i),
+        "SyncToken": "3",
+        "DisplayName": f"Lot {i} Auto Sales LLC",
+        "CompanyName": f"Lot {i} Auto Sales",
+        "PrimaryEmailAddr": {"Address": f"office{i}@lot{i}.example.com"},
+        "PrimaryPhone": {"FreeFormNumber": f"(555) 010-{i % 10000:04d}"},
+        "BillAddr": {"Line1": f"{i} Main St", "City": "Springfield", "CountrySubDivisionCode": "VA", "PostalCode": "22150"},
+        "Balance": round(i * 13.37, 2),
+        "Active": True,
+        "MetaData": {"CreateTime": "2025-01-02T10:00:00-08:00", "LastUpdatedTime": "2025-06-01T09:30:00-07:00"},
+    }
+
+
+def make_invoice(lines: int) -> dict:
+    return {
+        "Id": "1042",
+        "SyncToken": "12",
+        "DocNumber": "1042",
+        "TxnDate": "2025-06-01",
+        "CustomerRef": {"value": "58", "name": "Lot 58 Auto Sales LLC"},
+        "Line": [
+            {
+                "Id": str(n + 1),
+                "LineNum": n + 1,
+                "Amount": 150.0,
+                "DetailType": "SalesItemLineDetail",
+                "Description": "Generate Smart Key",
+                "SalesItemLineDetail": {"ItemRef": {"value": "7", "name": "Generate Smart Key"}, "Qty": 1, "UnitPrice": 150.0},
+            }
+            for n in range(lines)
+        ],
+        "TotalAmt": 150.0 * lines,
+        "Balance": 150.0 * lines,
+    }
+
+
+PAYLOADS = {
+    "customers_100": {"QueryResponse": {"Customer": [make_customer(i) for i in range(100)]}},
+    "customers_1000": {"QueryResponse": {"Customer": [make_customer(i) for i in range(1000)]}},
+    "invoice_40_lines": {"Invoice": make_invoice(40)},
+}
+
+
+def bench(fn, repeat: int) -> float:
+    """Best-of-5 microseconds per call."""
+    return min(timeit.repeat(fn, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def run(repeat: int) -> list[dict]:
+    rows = []
+    for name, payload in PAYLOADS.items():
+        body = json.dumps(payload).encode()
+        response = httpx.Response(200, content=body, headers={"content-type": "application/json"})
+        stdlib_parse = bench(lambda: response.json(), repeat)
+        codec_parse = bench(lambda: codec.loads(body), repeat)
+        stdlib_render = bench(lambda: JSONResponse(payload), repeat)
+        codec_render = bench(lambda: codec.FastJSONResponse(payload), repeat)
+        rows.append({
+            "payload": name,
+            "bytes": len(body),
+            "parse_stdlib_us": round(stdlib_parse, 1),
+            "parse_codec_us": round(codec_parse, 1),
+            "parse_speedup": round(stdlib_parse / codec_parse, 2),
+            "render_stdlib_us": round(stdlib_render, 1),
+            "render_codec_us": round(codec_render, 1),
+            "render_speedup": round(stdlib_render / codec_render, 2),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON codec micro-benchmark")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"codec backend: {'orjson' if codec.orjson is not None else 'stdlib json'}")
+    header = f"{'payload':<18}{'bytes':>9}{'parse std':>12}{'parse codec':>13}{'x':>7}{'render std':>12}{'render codec':>14}{'x':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in run(args.repeat):
+        print(
+            f"{r['payload']:<18}{r['bytes']:>9}{r['parse_stdlib_us']:>12}{r['parse_codec_us']:>13}{r['parse_speedup']:>7}"
+            f"{r['render_stdlib_us']:>12}{r['render_codec_us']:>14}{r['render_speedup']:>7}"
+        )
+    print("(times are microseconds per call, best of 5)")
+
+
+if __name__ == "__main__":
+    main()
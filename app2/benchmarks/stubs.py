@@ -0,0 +1,37 @@
+# app2/benchmarks/stubs.py
+#
+# In-process NHTSA stand-in used by the benchmarks (QuickBooks is served by
+# qb_emulator). It answers just enough of the API for the benchmarked routes
+# and adds a configurable latency per call, so results reflect our own
+# overhead plus the number of upstream round trips rather than network noise.
+
+import asyncio
+import random
+from collections import Counter
+import httpx
+
+
+class Upstreams:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls: Counter = Counter()
+
+    async def _delay(self):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def reset_counts(self):
+        self.calls.clear()
+
+    async def nhtsa(self, request: httpx.Request) -> httpx.Response:
+        await self._delay()
+        self.calls["nhtsa.decode"] += 1
+        return httpx.Response(200, json={"Results": [
+            {"Variable": "Make", "Value": "HONDA"},
+            {"Variable": "Model", "Value": "Accord"},
+            {"Variable": "Model Year", "Value": "2003"},
+            {"Variable": "Body Class", "Value": "Sedan/Saloon"},
+            {"Variable": "Fuel Type - Primary", "Value": "Gasoline"},
+        ]})
@@ -32,7 +32,73 @@ class Settings(BaseSettings):
 
     # === QuickBooks ===
     QB_ENVIRONMENT: str = "sandbox"
-    
+    # Override the Intuit hosts, e.g. to point at `python -m qb_emulator`
+    QB_BASE_URL: str | None = None
+    QB_OAUTH_URL: str | None = None
+    QB_CUSTOMER_SYNC_SECONDS: int = 60
+    QB_ITEM_CATALOG_TTL_SECONDS: int = 900
+    # An unknown item name reloads the catalog at most this often per realm
+    QB_ITEM_MISS_RELOAD_SECONDS: int = 30
+    QB_INVOICE_COALESCE_WINDOW_MS: int = 50
+    # Today's invoices are loaded realm-wide with one query and trusted this long;
+    # bounds how late we notice invoices created outside the app
+    QB_INVOICE_INDEX_TTL_SECONDS: int = 300
+    # Intuit webhooks (verifier token from the developer portal; unset disables
+    # /api/qb/webhooks) plus a ChangeDataCapture poll for missed events (0 disables)
+    QB_WEBHOOK_VERIFIER_TOKEN: str | None = None
+    QB_CDC_POLL_SECONDS: int = 600
+    # Background invoice email workers
+    QB_SEND_WORKERS: int = 4
+    QB_SEND_MAX_ATTEMPTS: int = 3
+    QB_SEND_JOB_TTL_SECONDS: int = 60 * 60 * 24
+    # On shutdown, queued sends get this long to finish before workers stop
+    QB_SEND_DRAIN_SECONDS: int = 10
+    QB_TOKEN_REFRESH_MARGIN_SECONDS: int = 300
+    # Intuit allows 500 requests/minute and 10 concurrent requests per realm
+    QB_RATE_LIMIT_PER_MINUTE: int = 500
+    QB_MAX_CONCURRENT_REQUESTS: int = 10
+    QB_MAX_RETRIES: int = 3
+    QB_BACKOFF_BASE_SECONDS: float = 1.0
+
+    # === VIN decode cache ===
+    VIN_CACHE_PATH: str = "vin_cache.sqlite3"
+    VIN_CACHE_MAX_ENTRIES: int = 5000
+    VIN_CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 180
+    VIN_CACHE_NEGATIVE_TTL_SECONDS: int = 60 * 60 * 24
+
+    # === Session store ===
+    # "memory" is per-process; use "sqlite" when running several workers
+    SESSION_BACKEND: str = "memory"
+    SESSION_DB_PATH: str = "sessions.sqlite3"
+    SESSION_TTL_SECONDS: int = 60 * 60 * 12
+    SESSION_MAX_ENTRIES: int = 10000
+
+    # === Idempotency keys (write endpoints) ===
+    IDEMPOTENCY_TTL_SECONDS: int = 60 * 60 * 24
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+
+    # === Static frontend ===
+    # Write .gz/.br siblings for the built assets on startup if missing
+    STATIC_PRECOMPRESS: bool = True
+
+    # === API response compression ===
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 9
+    COMPRESSION_BROTLI_QUALITY: int = 6
+    COMPRESSION_ZSTD_LEVEL: int = 10
+
+    # === Metrics ===
+    # When set, /metrics requires "Authorization: Bearer <token>"
+    METRICS_TOKEN: str | None = None
+
+    # === Outbound HTTP (pooled clients) ===
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_TIMEOUT: float = 20.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+
     model_config = ConfigDict(extra="allow")
 
 settings = Settings()
\ No newline at end of file
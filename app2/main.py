@@ -1,17 +1,27 @@
 # app2/main.py
 
 import os
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router
 from config import settings
 from utils import session
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from utils.http_clients import init_http_clients, close_http_clients
+from utils.vin_cache import vin_cache
+from utils.request_context import RequestContextMiddleware
+from utils.idempotency import IdempotencyMiddleware
+from utils.compression import CompressionMiddleware
+from utils.metrics import MetricsMiddleware
+from utils.static_files import StaticSite
+from utils.codec import FastJSONResponse
+from services import start_cdc_poller, stop_cdc_poller
+from utils.invoice_sender import invoice_sender
+from fastapi import Request
 from pathlib import Path
 
-app = FastAPI(title="Patriotic Keys API", debug=settings.DEBUG)
+app = FastAPI(title="Patriotic Keys API", debug=settings.DEBUG, default_response_class=FastJSONResponse)
 app.state.session_store = session.session_store
 
 # CORS setup
@@ -26,6 +36,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Idempotency-Key on the write endpoints techs retry from flaky connections
+app.add_middleware(IdempotencyMiddleware, routes=[
+    ("POST", "/api/jobs/locksmith"),
+    ("POST", "/api/qb/invoices/items"),
+    ("POST", "/api/qb/customers/[^/]+/invoices/today"),
+    ("POST", "/api/qb/invoices/send"),
+])
+
+# Parse auth/session cookies once per request into scope["state"]
+app.add_middleware(RequestContextMiddleware)
+
+# gzip/br/zstd for /api/* responses (static assets are precompressed)
+app.add_middleware(CompressionMiddleware, path_prefix="/api/")
+
+# Outermost, so latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -35,24 +62,30 @@ logging.basicConfig(
 @app.on_event("startup")
 async def startup_event():
     logging.info("🚀 Patriotic Keys API starting up")
+    await init_http_clients()
+    await asyncio.to_thread(static_site.load, settings.STATIC_PRECOMPRESS)
+    start_cdc_poller()
+    invoice_sender.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logging.info("🛑 Patriotic Keys API shutting down")
+    await stop_cdc_poller()
+    await invoice_sender.stop()
+    await close_http_clients()
+    vin_cache.close()
+    session.session_store.close()
 
 # Include your API routers here
 app.include_router(router)
 
-# Serve assets and other static files from /static/
-app.mount("/static", StaticFiles(directory="static/dist", html=True), name="static")
-
-# Set the absolute path to index.html
-index_file = Path(__file__).resolve().parent / "static" / "dist" / "index.html"
+# Built frontend: precompressed assets under /static/, index.html for every other path
+static_site = StaticSite(Path(__file__).resolve().parent / "static" / "dist")
 
-# @app.get("/")
-# async def serve_root():
-#     return FileResponse(index_file)
+@app.api_route("/static/{asset_path:path}", methods=["GET", "HEAD"])
+async def serve_static(asset_path: str, request: Request):
+    return static_site.file_response(asset_path, request)
 
-@app.get("/{full_path:path}")
-async def spa_fallback(full_path: str):
-    return FileResponse(index_file)
\ No newline at end of file
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+async def spa_fallback(full_path: str, request: Request):
+    return static_site.index_response(request)
\ No newline at end of file
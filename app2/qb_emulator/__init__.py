@@ -0,0 +1,4 @@
+# app2/qb_emulator/__init__.py
+
+from .app import create_app, Emulator, EmulatorConfig
+from .store import Company, QBFault
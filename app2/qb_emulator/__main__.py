@@ -0,0 +1,39 @@
+# app2/qb_emulator/__main__.py
+#
+# Run the emulator as a server, then start the app with
+#   QB_BASE_URL=http://127.0.0.1:8100 QB_OAUTH_URL=http://127.0.0.1:8100/oauth2/v1/tokens/bearer
+#
+#   python -m qb_emulator --port 8100 --latency-ms 120 --fail-429-rate 0.02
+
+import argparse
+import uvicorn
+from qb_emulator.app import EmulatorConfig, create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local QuickBooks Online API emulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--fail-401-rate", type=float, default=0.0)
+    parser.add_argument("--fail-429-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-seconds", type=float, default=1.0)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--enforce-auth", action="store_true")
+    args = parser.parse_args()
+
+    config = EmulatorConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        fail_401_rate=args.fail_401_rate,
+        fail_429_rate=args.fail_429_rate,
+        retry_after_seconds=args.retry_after_seconds,
+        customers=args.customers,
+        enforce_auth=args.enforce_auth,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
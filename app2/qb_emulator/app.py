@@ -0,0 +1,273 @@
+# app2/qb_emulator/app.py
+
+import asyncio
+import random
+import secrets
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from urllib.parse import unquote
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from qb_emulator.query import QueryError, execute, parse_query
+from qb_emulator.store import Company, QBFault, now_iso
+
+# ASGI stand-in for the QuickBooks Online v3 API and the Intuit OAuth token
+# endpoint, covering what utils/qb.py uses. Point the app at it with
+# QB_BASE_URL / QB_OAUTH_URL, or mount it in-process via httpx.ASGITransport.
+
+ENTITY_PATHS = {"customer": "Customer", "item": "Item", "invoice": "Invoice"}
+BATCH_LIMIT = 30
+
+
+@dataclass
+class EmulatorConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Probability (0..1) that an API call is answered with 401 / 429
+    fail_401_rate: float = 0.0
+    fail_429_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    # Customers seeded into every new company
+    customers: int = 50
+    token_ttl_seconds: int = 3600
+    # When False any bearer token is accepted; when True only tokens issued
+    # by the token endpoint (and not yet expired) are
+    enforce_auth: bool = False
+
+    def update(self, values: dict):
+        known = {f.name for f in fields(self)}
+        for key, value in values.items():
+            if key in known:
+                setattr(self, key, _coerce(value, type(getattr(self, key))))
+
+
+def _coerce(value, kind: type):
+    # bool("false") is True: parse strings explicitly
+    if kind is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return kind(value)
+
+
+class Emulator:
+    def __init__(self, config: EmulatorConfig):
+        self.config = config
+        self.reset()
+
+    def reset(self):
+        self.companies: dict[str, Company] = {}
+        self.access_tokens: dict[str, float] = {}
+        self.refresh_tokens: set[str] = set()
+        self.calls: Counter = Counter()
+        # (realm_id, requestid) -> (status, body) of the first write carrying it
+        self.request_ids: dict[tuple[str, str], tuple[int, bytes]] = {}
+
+    def company(self, realm_id: str) -> Company:
+        company = self.companies.get(realm_id)
+        if company is None:
+            company = self.companies[realm_id] = Company(realm_id, customers=self.config.customers)
+        return company
+
+    def issue_tokens(self) -> dict:
+        access, refresh = secrets.token_urlsafe(24), secrets.token_urlsafe(24)
+        self.access_tokens[access] = time.monotonic() + self.config.token_ttl_seconds
+        self.refresh_tokens.add(refresh)
+        return {
+            "token_type": "bearer",
+            "access_token": access,
+            "refresh_token": refresh,
+            "expires_in": self.config.token_ttl_seconds,
+            "x_refresh_token_expires_in": 8726400,
+        }
+
+    def authorized(self, request: Request) -> bool:
+        header = request.headers.get("authorization", "")
+        if not header.startswith("Bearer ") or not header[7:]:
+            return False
+        if not self.config.enforce_auth:
+            return True
+        expires_at = self.access_tokens.get(header[7:])
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "total_calls": sum(n for op, n in self.calls.items() if not op.startswith("injected.")),
+            "companies": {realm: {e: len(rows) for e, rows in c.entities.items()} for realm, c in self.companies.items()},
+            "config": asdict(self.config),
+        }
+
+
+def _fault(fault: QBFault) -> JSONResponse:
+    return JSONResponse({"Fault": fault.body(), "time": now_iso()}, status_code=fault.status)
+
+
+def _auth_fault() -> JSONResponse:
+    return JSONResponse({
+        "fault": {"error": [{
+            "message": "message=AuthenticationFailed; errorCode=003200; statusCode=401",
+            "detail": "Token expired or invalid",
+            "code": "3200",
+        }], "type": "AUTHENTICATION"},
+        "time": now_iso(),
+    }, status_code=401)
+
+
+def _query_response(company: Company, text: str) -> dict:
+    query = parse_query(text)
+    rows = execute(query, company.rows(query.entity))
+    if not rows:
+        return {}
+    return {query.entity: rows, "startPosition": query.start, "maxResults": len(rows)}
+
+
+def create_app(config: EmulatorConfig | None = None) -> FastAPI:
+    emulator = Emulator(config or EmulatorConfig())
+    app = FastAPI(title="QuickBooks emulator", docs_url=None, redoc_url=None)
+    app.state.emulator = emulator
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        if not request.url.path.startswith("/v3/"):
+            return await call_next(request)
+        cfg = emulator.config
+        delay = cfg.latency_ms + random.uniform(0, cfg.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if cfg.fail_429_rate and random.random() < cfg.fail_429_rate:
+            emulator.calls["injected.429"] += 1
+            return JSONResponse(
+                {"Fault": {"Error": [{"Message": "ThrottleExceeded", "Detail": "Request rate exceeded", "code": "003001"}], "type": "SERVICE"}},
+                status_code=429,
+                headers={"Retry-After": str(cfg.retry_after_seconds)},
+            )
+        if (cfg.fail_401_rate and random.random() < cfg.fail_401_rate) or not emulator.authorized(request):
+            emulator.calls["injected.401"] += 1
+            return _auth_fault()
+
+        # QuickBooks answers a repeated write `requestid` with the original response
+        request_id = request.query_params.get("requestid")
+        if request.method != "POST" or not request_id:
+            return await call_next(request)
+        key = (request.url.path.split("/")[3], request_id)
+        if key in emulator.request_ids:
+            emulator.calls["requestid.replayed"] += 1
+            status, body = emulator.request_ids[key]
+            return Response(body, status_code=status, media_type="application/json")
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        emulator.request_ids[key] = (response.status_code, body)
+        return Response(body, status_code=response.status_code, media_type="application/json")
+
+    @app.exception_handler(QBFault)
+    async def qb_fault(request: Request, fault: QBFault):
+        return _fault(fault)
+
+    @app.post("/oauth2/v1/tokens/bearer")
+    async def token(request: Request):
+        form = await request.form()
+        grant_type = form.get("grant_type")
+        emulator.calls[f"oauth.{grant_type}"] += 1
+        if grant_type == "refresh_token":
+            refresh = form.get("refresh_token")
+            if not refresh or (emulator.config.enforce_auth and refresh not in emulator.refresh_tokens):
+                return JSONResponse({"error": "invalid_grant"}, status_code=400)
+            emulator.refresh_tokens.discard(refresh)
+        elif grant_type != "authorization_code" or not form.get("code"):
+            return JSONResponse({"error": "invalid_request"}, status_code=400)
+        return emulator.issue_tokens()
+
+    @app.api_route("/v3/company/{realm_id}/query", methods=["GET", "POST"])
+    async def query(realm_id: str, request: Request):
+        # query_params are already decoded; only the raw POST body may still be
+        text = request.query_params.get("query")
+        if text is None:
+            text = unquote((await request.body()).decode())
+        try:
+            parsed_entity = parse_query(text).entity
+            emulator.calls[f"query.{parsed_entity.lower()}"] += 1
+            return {"QueryResponse": _query_response(emulator.company(realm_id), text), "time": now_iso()}
+        except QueryError as e:
+            raise QBFault("4000", "Error parsing query", str(e))
+
+    @app.get("/v3/company/{realm_id}/cdc")
+    async def cdc(realm_id: str, entities: str, changedSince: str):
+        emulator.calls["cdc"] += 1
+        company = emulator.company(realm_id)
+        responses = [
+            {entity: company.changed_since(entity, changedSince)}
+            for entity in entities.split(",") if entity in company.entities
+        ]
+        return {"CDCResponse": [{"QueryResponse": responses}], "time": now_iso()}
+
+    @app.post("/v3/company/{realm_id}/batch")
+    async def batch(realm_id: str, request: Request):
+        items = (await request.json()).get("BatchItemRequest", [])
+        emulator.calls["batch"] += 1
+        if len(items) > BATCH_LIMIT:
+            raise QBFault("1040", "Batch size exceeded", f"At most {BATCH_LIMIT} operations per batch")
+        company = emulator.company(realm_id)
+        out = []
+        for item in items:
+            entry = {"bId": item.get("bId")}
+            try:
+                if "Query" in item:
+                    entry["QueryResponse"] = _query_response(company, item["Query"])
+                else:
+                    entity = next(k for k in item if k in company.entities)
+                    if item.get("operation") == "update":
+                        entry[entity] = company.update(entity, item[entity], sparse=item[entity].get("sparse", False))
+                    else:
+                        entry[entity] = company.create(entity, item[entity])
+            except QBFault as fault:
+                entry["Fault"] = fault.body()
+            except (QueryError, StopIteration) as e:
+                entry["Fault"] = QBFault("4000", "Unsupported batch item", str(e)).body()
+            out.append(entry)
+        return {"BatchItemResponse": out, "time": now_iso()}
+
+    @app.post("/v3/company/{realm_id}/invoice/{invoice_id}/send")
+    async def send(realm_id: str, invoice_id: str, sendTo: str | None = None):
+        emulator.calls["invoice.send"] += 1
+        return {"Invoice": emulator.company(realm_id).send(invoice_id, sendTo), "time": now_iso()}
+
+    @app.get("/v3/company/{realm_id}/{entity_path}/{entity_id}")
+    async def read(realm_id: str, entity_path: str, entity_id: str):
+        entity = ENTITY_PATHS.get(entity_path)
+        if entity is None:
+            raise QBFault("2010", "Unsupported entity", entity_path, status=404)
+        emulator.calls[f"{entity_path}.read"] += 1
+        return {entity: emulator.company(realm_id).get(entity, entity_id), "time": now_iso()}
+
+    @app.post("/v3/company/{realm_id}/{entity_path}")
+    async def write(realm_id: str, entity_path: str, request: Request, operation: str | None = None):
+        entity = ENTITY_PATHS.get(entity_path)
+        if entity is None:
+            raise QBFault("2010", "Unsupported entity", entity_path, status=404)
+        body = await request.json()
+        company = emulator.company(realm_id)
+        if operation == "update":
+            emulator.calls[f"{entity_path}.update"] += 1
+            obj = company.update(entity, body, sparse=bool(body.get("sparse")))
+        else:
+            emulator.calls[f"{entity_path}.create"] += 1
+            obj = company.create(entity, body)
+        return {entity: obj, "time": now_iso()}
+
+    # --- Control endpoints for tests and benchmarks ---
+
+    @app.get("/_emulator/stats")
+    async def stats():
+        return emulator.stats()
+
+    @app.post("/_emulator/config")
+    async def configure(request: Request):
+        emulator.config.update(await request.json())
+        return asdict(emulator.config)
+
+    @app.post("/_emulator/reset")
+    async def reset():
+        emulator.reset()
+        return {"message": "reset"}
+
+    return app
@@ -0,0 +1,127 @@
+# app2/qb_emulator/query.py
+
+import re
+from dataclasses import dataclass, field
+
+# Parser/evaluator for the subset of the QuickBooks query language we issue:
+#   select <*|f1, f2> from <Entity>
+#     [where <cond> (and <cond>)*]
+#     [order by <field> [asc|desc]]
+#     [STARTPOSITION n] [MAXRESULTS n]
+# where <cond> is `Field <op> 'value'` (op: = != < > <= >= LIKE) or
+# `Field IN ('a', 'b')`; unquoted values (true, 42) are allowed too. Dotted fields (CustomerRef, MetaData.CreateTime)
+# are resolved through nested objects; a Ref resolves to its `value`.
+
+
+class QueryError(ValueError):
+    pass
+
+
+@dataclass
+class Condition:
+    field: str
+    op: str
+    value: str | list[str]
+
+
+@dataclass
+class Query:
+    entity: str
+    fields: list[str] | None
+    conditions: list[Condition] = field(default_factory=list)
+    order_by: str | None = None
+    descending: bool = False
+    start: int = 1
+    max_results: int = 100
+
+
+_QUERY = re.compile(
+    r"^\s*select\s+(?P<fields>.+?)\s+from\s+(?P<entity>\w+)"
+    r"(?:\s+where\s+(?P<where>.+?))?"
+    r"(?:\s+order\s+by\s+(?P<order>[\w.]+)(?:\s+(?P<dir>asc|desc))?)?"
+    r"(?:\s+startposition\s+(?P<start>\d+))?"
+    r"(?:\s+maxresults\s+(?P<max>\d+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+# String literals may contain \' escapes
+_STRING = r"'((?:[^'\\]|\\.)*)'"
+_CONDITION = re.compile(
+    r"^\s*(?P<field>[\w.]+)\s*(?:(?P<op><=|>=|!=|=|<|>|like)\s*(?:" + _STRING + r"|(?P<bare>[\w.:+-]+))"
+    r"|in\s*\((?P<list>.*)\))\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_AND = re.compile(r"\s+and\s+(?=(?:[^']*'[^']*')*[^']*$)", re.IGNORECASE)
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def parse_query(text: str) -> Query:
+    match = _QUERY.match(text)
+    if not match:
+        raise QueryError(f"Unsupported query: {text}")
+
+    fields = [f.strip() for f in match.group("fields").split(",")]
+    query = Query(
+        entity=match.group("entity"),
+        fields=None if fields == ["*"] else fields,
+        order_by=match.group("order"),
+        descending=(match.group("dir") or "").lower() == "desc",
+        start=int(match.group("start") or 1),
+        max_results=min(int(match.group("max") or 100), 1000),
+    )
+    if match.group("where"):
+        for part in _AND.split(match.group("where")):
+            cond = _CONDITION.match(part)
+            if not cond:
+                raise QueryError(f"Unsupported condition: {part}")
+            if cond.group("list") is not None:
+                values = [_unescape(v) for v in re.findall(_STRING, cond.group("list"))]
+                query.conditions.append(Condition(cond.group("field"), "in", values))
+            else:
+                value = cond.group("bare") if cond.group("bare") is not None else _unescape(cond.group(3))
+                query.conditions.append(Condition(cond.group("field"), cond.group("op").lower(), value))
+    return query
+
+
+def resolve(entity: dict, path: str):
+    value = entity
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    if isinstance(value, dict) and "value" in value:
+        return value["value"]
+    return value
+
+
+def _like(value: str, pattern: str) -> bool:
+    regex = "^" + ".*".join(re.escape(p) for p in pattern.split("%")) + "$"
+    return re.match(regex, value, re.IGNORECASE | re.DOTALL) is not None
+
+
+def matches(entity: dict, cond: Condition) -> bool:
+    value = resolve(entity, cond.field)
+    if value is None:
+        return False
+    value = ("true" if value else "false") if isinstance(value, bool) else str(value)
+    if cond.op == "in":
+        return value in cond.value
+    if cond.op == "like":
+        return _like(value, cond.value)
+    if cond.op == "=":
+        return value == cond.value or (value in ("true", "false") and value == cond.value.lower())
+    if cond.op == "!=":
+        return value != cond.value
+    return {"<": value < cond.value, ">": value > cond.value, "<=": value <= cond.value, ">=": value >= cond.value}[cond.op]
+
+
+def execute(query: Query, rows: list[dict]) -> list[dict]:
+    result = [row for row in rows if all(matches(row, c) for c in query.conditions)]
+    if query.order_by:
+        result.sort(key=lambda row: str(resolve(row, query.order_by) or ""), reverse=query.descending)
+    result = result[query.start - 1:query.start - 1 + query.max_results]
+    if query.fields is not None:
+        result = [{f: row[f] for f in query.fields if f in row} for row in result]
+    return result
@@ -0,0 +1,135 @@
+# app2/qb_emulator/store.py
+
+import copy
+from datetime import datetime, timezone
+
+# In-memory company data for the emulator, one Company per realm. Every
+# write bumps SyncToken and LastUpdatedTime; updates carrying a stale
+# SyncToken fail with Fault 5010 exactly like QuickBooks does.
+
+DEFAULT_ITEMS = (
+    "Generate Smart Key",
+    "Generate High Security Transponder Key",
+    "Generate Transponder Key",
+)
+
+
+class QBFault(Exception):
+    def __init__(self, code: str, message: str, detail: str = "", status: int = 400, fault_type: str = "ValidationFault"):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.detail = detail or message
+        self.status = status
+        self.fault_type = fault_type
+
+    def body(self) -> dict:
+        return {
+            "Error": [{"Message": self.message, "Detail": self.detail, "code": self.code}],
+            "type": self.fault_type,
+        }
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class Company:
+    def __init__(self, realm_id: str, customers: int = 0):
+        self.realm_id = realm_id
+        self.entities: dict[str, dict[str, dict]] = {"Customer": {}, "Item": {}, "Invoice": {}}
+        self._next_id = 0
+        for name in DEFAULT_ITEMS:
+            self.create("Item", {"Name": name, "Type": "Service", "Active": True})
+        for i in range(1, customers + 1):
+            self.create("Customer", {"DisplayName": f"Customer {i:04d}", "Active": True})
+
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return str(self._next_id)
+
+    def rows(self, entity: str) -> list[dict]:
+        return list(self.entities.get(entity, {}).values())
+
+    def get(self, entity: str, entity_id: str) -> dict:
+        found = self.entities.get(entity, {}).get(entity_id)
+        if found is None:
+            raise QBFault("610", "Object Not Found", f"{entity} {entity_id} not found")
+        return found
+
+    def create(self, entity: str, body: dict) -> dict:
+        if entity not in self.entities:
+            raise QBFault("2010", "Unsupported entity", entity)
+        stamp = now_iso()
+        obj = copy.deepcopy(body)
+        obj.update({
+            "Id": self._new_id(),
+            "SyncToken": "0",
+            "domain": "QBO",
+            "MetaData": {"CreateTime": stamp, "LastUpdatedTime": stamp},
+        })
+        if entity == "Customer":
+            if not obj.get("DisplayName"):
+                raise QBFault("2020", "Required param missing", "DisplayName is required")
+            if any(c.get("DisplayName") == obj["DisplayName"] for c in self.rows("Customer")):
+                raise QBFault("6240", "Duplicate Name Exists Error", "The name supplied already exists.")
+            obj.setdefault("Active", True)
+        if entity == "Invoice":
+            self._price_invoice(obj)
+            obj.setdefault("TxnDate", datetime.now().date().isoformat())
+            obj["DocNumber"] = obj.get("DocNumber") or obj["Id"]
+            obj["EmailStatus"] = "NotSet"
+        self.entities[entity][obj["Id"]] = obj
+        return obj
+
+    def update(self, entity: str, body: dict, sparse: bool) -> dict:
+        current = self.get(entity, str(body.get("Id")))
+        if str(body.get("SyncToken")) != current["SyncToken"]:
+            raise QBFault(
+                "5010", "Stale Object Error",
+                f"You and {body.get('Id')} are working on this at the same time. "
+                f"Stale SyncToken {body.get('SyncToken')}, current {current['SyncToken']}",
+            )
+        updated = copy.deepcopy(current) if sparse else {"Id": current["Id"], "MetaData": dict(current["MetaData"])}
+        for key, value in body.items():
+            if key not in ("Id", "SyncToken", "sparse", "MetaData"):
+                updated[key] = copy.deepcopy(value)
+        updated["SyncToken"] = str(int(current["SyncToken"]) + 1)
+        updated["MetaData"]["LastUpdatedTime"] = now_iso()
+        if entity == "Invoice":
+            self._price_invoice(updated)
+        self.entities[entity][updated["Id"]] = updated
+        return updated
+
+    def send(self, invoice_id: str, email: str | None = None) -> dict:
+        invoice = self.get("Invoice", invoice_id)
+        invoice["EmailStatus"] = "EmailSent"
+        if email:
+            invoice["BillEmail"] = {"Address": email}
+        invoice["SyncToken"] = str(int(invoice["SyncToken"]) + 1)
+        invoice["MetaData"]["LastUpdatedTime"] = now_iso()
+        return invoice
+
+    def changed_since(self, entity: str, since: str) -> list[dict]:
+        since_dt = _parse_time(since)
+        return [row for row in self.rows(entity) if _parse_time(row["MetaData"]["LastUpdatedTime"]) > since_dt]
+
+    def _price_invoice(self, invoice: dict):
+        total = 0.0
+        for n, line in enumerate(invoice.get("Line", []) or [], start=1):
+            detail = line.get("SalesItemLineDetail")
+            if detail is None:
+                continue
+            line.setdefault("Id", str(n))
+            line["LineNum"] = n
+            qty = float(detail.get("Qty", 1) or 1)
+            price = float(detail.get("UnitPrice", 0) or 0)
+            line["Amount"] = round(qty * price, 2) if "Amount" not in line else line["Amount"]
+            total += float(line["Amount"])
+        invoice["TotalAmt"] = round(total, 2)
+        invoice["Balance"] = invoice["TotalAmt"]
@@ -6,6 +6,7 @@ from .vehicle_routes import router as vehicles_router
 from .qb_auth_routes import router as qb_auth_router
 from .qb_routes import router as qb_router
 from .jobs_routes import router as jobs_router
+from .metrics_routes import router as metrics_router
 
 router = APIRouter()
 
@@ -14,4 +15,5 @@ router.include_router(vehicles_router, prefix="/api/vehicles", tags=["Vehicles"]
 router.include_router(qb_auth_router, prefix="/api/qb-auth", tags=["Quickbooks Auth"])
 router.include_router(qb_router, prefix="/api/qb", tags=["QuickBooks"])
 router.include_router(jobs_router, prefix="/api/jobs", tags=["Jobs"])
+router.include_router(metrics_router, tags=["Metrics"])
 
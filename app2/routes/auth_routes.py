@@ -1,7 +1,7 @@
 # app2/routes/auth_routes.py
 
 from fastapi import APIRouter, HTTPException, status, Request, Depends
-from fastapi.responses import JSONResponse
+from utils.codec import FastJSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from pydantic import BaseModel, EmailStr, field_validator
@@ -16,6 +16,7 @@ from utils.tokens import (
 )
 
 from utils.csrf import verify_csrf
+from utils.request_context import RequestContext, get_request_context
 from utils.qb import refresh_qb_tokens
 
 router = APIRouter()
@@ -54,7 +55,7 @@ async def login(payload: LoginRequest, request: Request):
         raise HTTPException(status_code=502, detail="QuickBooks token refresh failed")
 
     realm_id = request.cookies.get("qb_realm_id") or ""
-    response = JSONResponse(content={
+    response = FastJSONResponse(content={
         "message": "Login successful",
         "user": {
             "email": user["email"],
@@ -94,12 +95,16 @@ async def login(payload: LoginRequest, request: Request):
     return response
 
 
-async def get_current_user(request: Request):
-    token = request.cookies.get("jwt_token")
+async def get_current_user(ctx: RequestContext = Depends(get_request_context)):
+    if ctx.user is not None:
+        return ctx.user
+
+    token = ctx.jwt_token
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
 
     try:
+        # Signature is checked once per token; repeats come from the cache
         payload = decode_access_token(token)
         email: str = payload.get("sub")
         if not email or email != USER_STORE["email"]:
@@ -107,6 +112,7 @@ async def get_current_user(request: Request):
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
 
+    ctx.user = USER_STORE
     return USER_STORE
 
 
@@ -124,7 +130,7 @@ async def get_current(user: dict = Depends(get_current_user)):
 async def logout():
     secure_cookie = settings.ENVIRONMENT == "production"
 
-    response = JSONResponse(content={"message": "Logout successful"})
+    response = FastJSONResponse(content={"message": "Logout successful"})
     response.delete_cookie("qb_access_token", httponly=True, samesite="none", secure=secure_cookie)
     response.delete_cookie("csrf_token", httponly=False, samesite="none", secure=secure_cookie)
     response.delete_cookie("qb_realm_id", httponly=True, samesite="none", secure=secure_cookie)
@@ -1,41 +1,53 @@
 # app2/routes/jobs_routes.py
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from schemas.job_schemas import JobCreate
-from services.invoice_services import add_job_to_invoice
+from services.invoice_services import add_job_stages
 from utils.csrf import verify_csrf
-from utils.session import get_current_qb_customer
+from utils.pipeline import Pipeline
+from utils.request_context import RequestContext, get_request_context
 from routes.vehicle_routes import fetch_vehicle_data
 
 router = APIRouter()
 
 @router.post("/locksmith")
-async def locksmith_job(payload: JobCreate, request: Request):
+async def locksmith_job(
+    payload: JobCreate,
+    request: Request,
+    response: Response,
+    ctx: RequestContext = Depends(get_request_context),
+):
     verify_csrf(request)
 
-    customer_id = get_current_qb_customer(request)
-    if not customer_id:
+    if not await ctx.get_customer_id():
         raise HTTPException(status_code=401, detail="No QuickBooks customer selected")
 
-    try:
-        vehicle = await fetch_vehicle_data(payload.vin)
-    except HTTPException as e:
-        raise e
-    except Exception:
-        raise HTTPException(status_code=502, detail="Failed to decode VIN")
-
-    try:
-        updated_invoice = await add_job_to_invoice(
-            description=payload.service.value,
-            qty=payload.Qty,
-            rate=payload.UnitPrice,
-            item_name=payload.service.value,
-            request=request
-        )
-    except HTTPException:
-        raise
+    async def decode_vin():
+        try:
+            return await fetch_vehicle_data(payload.vin)
+        except HTTPException:
+            raise
+        except Exception:
+            raise HTTPException(status_code=502, detail="Failed to decode VIN")
+
+    # VIN decode runs alongside item resolution and today's-invoice lookup,
+    # but the invoice is only written once the decode has succeeded
+    pipeline = Pipeline()
+    pipeline.stage("vin", decode_vin)
+    invoice_stage = await add_job_stages(
+        pipeline,
+        description=payload.service.value,
+        qty=payload.Qty,
+        rate=payload.UnitPrice,
+        item_name=payload.service.value,
+        request=request,
+        after=("vin",),
+    )
+
+    results = await pipeline.run()
+    response.headers["Server-Timing"] = pipeline.server_timing()
 
     return {
-        "invoice": updated_invoice,
-        "vehicle": vehicle
-    }
\ No newline at end of file
+        "invoice": results[invoice_stage],
+        "vehicle": results["vin"]
+    }
@@ -0,0 +1,87 @@
+# app2/routes/metrics_routes.py
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from config import settings
+from utils.metrics import core_exposition
+from utils.vin_cache import vin_cache
+from utils.tokens import token_cache_stats
+from utils.rate_limit import governor_stats
+from utils.compression import compression_stats
+from utils.invoice_writer import queue_depth
+from utils.invoice_state import index_size
+from utils.idempotency import idempotency_stats
+from utils.invoice_sender import invoice_sender
+from utils.qb_token_manager import qb_token_manager
+from services import cdc_stats
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    out = core_exposition()
+
+    vin = vin_cache.stats()
+    out.family("pk_vin_cache_lookups_total", "counter", "VIN cache lookups by tier/result.", [
+        ({"result": "memory_hit"}, vin["memory_hits"]),
+        ({"result": "disk_hit"}, vin["disk_hits"]),
+        ({"result": "miss"}, vin["misses"]),
+    ])
+    out.family("pk_vin_cache_negative_hits_total", "counter", "VIN cache hits on undecodable VINs.", [({}, vin["negative_hits"])])
+    out.family("pk_vin_cache_memory_entries", "gauge", "VINs held in the memory tier.", [({}, vin["memory_size"])])
+
+    jwt = token_cache_stats()
+    out.family("pk_jwt_cache_lookups_total", "counter", "Verified-JWT cache lookups.", [
+        ({"result": "hit"}, jwt["hits"]),
+        ({"result": "miss"}, jwt["misses"]),
+    ])
+    out.family("pk_qb_token_refreshes_total", "counter", "QuickBooks access token refreshes.", [({}, qb_token_manager.refresh_count)])
+
+    governors = governor_stats()
+    out.family("pk_qb_limiter_queue_depth", "gauge", "QuickBooks calls waiting for a rate-limit slot.",
+               (({"realm": realm}, s["queue_depth"]) for realm, s in governors.items()))
+    out.family("pk_qb_limiter_in_flight", "gauge", "QuickBooks calls holding a concurrency slot.",
+               (({"realm": realm}, s["in_flight"]) for realm, s in governors.items()))
+    out.family("pk_qb_limiter_wait_seconds_total", "counter", "Time spent waiting for rate-limit slots.",
+               (({"realm": realm}, s["wait_seconds_total"]) for realm, s in governors.items()))
+    out.family("pk_qb_limiter_throttled_total", "counter", "429 responses from QuickBooks.",
+               (({"realm": realm}, s["throttled"]) for realm, s in governors.items()))
+
+    comp = compression_stats()
+    out.family("pk_compression_bytes_total", "counter", "API response bytes before/after compression.", [
+        ({"stage": "in"}, comp["bytes_in"]),
+        ({"stage": "out"}, comp["bytes_out"]),
+    ])
+    out.family("pk_compression_cpu_seconds_total", "counter", "CPU time spent compressing responses.", [({}, comp["cpu_seconds"])])
+    out.family("pk_compression_responses_total", "counter", "API responses by compression decision.", [
+        ({"result": "compressed"}, comp["compressed"]),
+        ({"result": "below_threshold"}, comp["skipped"]),
+    ])
+
+    out.family("pk_invoice_index_entries", "gauge", "Customers with today's invoice in the daily index.",
+               (({"realm": realm}, n) for realm, n in index_size().items()))
+    idem = idempotency_stats()
+    out.family("pk_idempotent_requests_total", "counter", "Idempotency-Key requests by outcome.", [
+        ({"outcome": outcome}, idem[outcome]) for outcome in ("executed", "replayed", "joined", "conflicts")
+    ])
+    out.family("pk_invoice_send_queue_depth", "gauge", "Invoice emails waiting for a worker.", [({}, invoice_sender.queue_depth())])
+    out.family("pk_invoice_send_jobs_total", "counter", "Invoice email jobs by outcome.",
+               (({"outcome": outcome}, n) for outcome, n in invoice_sender.counts.items()))
+    out.family("pk_invoice_writer_queue_depth", "gauge", "Invoice lines waiting to be flushed.", [({}, queue_depth())])
+    cdc = cdc_stats()
+    out.family("pk_qb_cdc_polls_total", "counter", "ChangeDataCapture polls by outcome.", [
+        ({"outcome": "ok"}, cdc["polls"]),
+        ({"outcome": "failed"}, cdc["poll_failures"]),
+    ])
+    out.family("pk_qb_cdc_skipped_cycles_total", "counter", "CDC poll cycles skipped for lack of an access token.",
+               [({}, cdc["skipped_cycles"])])
+    out.family("pk_qb_webhook_ignored_total", "counter", "Webhook notifications for realms with nothing cached.",
+               [({}, cdc["ignored_notifications"])])
+
+    return PlainTextResponse(out.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,10 +1,9 @@
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse
+from utils.codec import FastJSONResponse
 from starlette.responses import RedirectResponse
 import os
 import urllib.parse
-import httpx
-import base64
+from utils.qb_token_manager import qb_token_manager
 
 router = APIRouter()
 
@@ -12,42 +11,17 @@ router = APIRouter()
 @router.get("/refresh-token")
 async def refresh_qb_access_token(request: Request):
     refresh_token = request.cookies.get("qb_refresh_token")
-    print("🔍 REFRESH TOKEN VALUE:", refresh_token)
-    client_id = os.getenv("QB_CLIENT_ID")
-    client_secret = os.getenv("QB_CLIENT_SECRET")
 
-    if not refresh_token or not client_id or not client_secret:
+    if not refresh_token:
         raise HTTPException(status_code=400, detail="Missing refresh token or credentials")
 
-    auth = f"{client_id}:{client_secret}".encode()
-    headers = {
-        "Authorization": f"Basic {base64.b64encode(auth).decode()}",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json",
-    }
-
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-    }
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer",
-            headers=headers,
-            data=data,
-        )
+    # Shares the in-process, single-flight refresh with safe_qb_request
+    new_qb_access_token, new_refresh_token = await qb_token_manager.refresh(
+        failed_token=request.cookies.get("qb_access_token"),
+        refresh_token=refresh_token,
+    )
 
-    if response.status_code != 200:
-        print("🔴 QuickBooks 400 response:", response.text)
-        raise HTTPException(status_code=500, detail=f"Refresh failed: {response.text}")
-
-    token_data = response.json()
-
-    new_qb_access_token = token_data["access_token"]
-    new_refresh_token = token_data["refresh_token"]
-
-    response = JSONResponse(content={"message": "Tokens refreshed."})
+    response = FastJSONResponse(content={"message": "Tokens refreshed."})
     response.set_cookie("qb_access_token", new_qb_access_token, httponly=True)
     response.set_cookie("qb_refresh_token", new_refresh_token, httponly=True)
     return response
@@ -86,41 +60,9 @@ async def qb_callback(request: Request):
     if not code or not realm_id:
         raise HTTPException(status_code=400, detail="Missing code or realmId in callback.")
 
-    token_url = "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer"
-    
-    client_id = os.getenv("QB_CLIENT_ID")
-    client_secret = os.getenv("QB_CLIENT_SECRET")
-    auth_bytes = f"{client_id}:{client_secret}".encode("utf-8")
-    auth_header = base64.b64encode(auth_bytes).decode("utf-8")
-    
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Authorization": f"Basic {auth_header}",
-    }
-    
-    body = {
-        "grant_type": "authorization_code",
-        "code": code,
-        "redirect_uri": os.getenv("QB_REDIRECT_URI"),
-    }
-
     print("🚨 Using redirect_uri for token exchange:", os.getenv("QB_REDIRECT_URI"))
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(token_url, data=body, headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail=f"Token exchange failed: {response.text}")
-
-    if response.status_code != 200:
-        print("🟥 TOKEN RESPONSE TEXT:", response.text)
-        raise HTTPException(status_code=500, detail=f"Token exchange failed: {response.text}")
 
-    token_data = response.json()
-    qb_access_token = token_data.get("access_token")
-    refresh_token = token_data.get("refresh_token")
-    print("🆕 REFRESH TOKEN:", refresh_token)
+    qb_access_token, refresh_token = await qb_token_manager.exchange_code(code, os.getenv("QB_REDIRECT_URI"))
     response_redirect = RedirectResponse(url=os.getenv("QB_POST_LOGIN_REDIRECT", "/home"))
 
     response_redirect.set_cookie("qb_access_token", qb_access_token, httponly=True)
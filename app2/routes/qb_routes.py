@@ -1,85 +1,111 @@
 # app2/routes/qb_routes.py
 
-from fastapi import APIRouter, Request, Body, HTTPException
+from fastapi import APIRouter, Request, Body, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
+from typing import Optional
 import re
 from utils.qb import (
+    QB_PAGE_SIZE,
     search_customers,
+    iter_customer_pages,
     create_customer,
     get_today_invoice_only,
     create_today_invoice,
-    send_invoice_email,
     get_all_invoices_for_customer,
-    get_all_qb_items
-)
-from utils.session import (
-    get_session_id,
-    set_current_qb_customer,
-    get_current_qb_customer,
-    reset_qb_customer
+    load_item_catalog,
 )
+from utils.request_context import RequestContext, get_request_context, require_qb_context
 from utils.csrf import verify_csrf
-from services import add_job_to_invoice
+from services import add_job_to_invoice, add_jobs_in_batch, load_customer_directory, customer_exists, send_today_invoice
+from services import verify_signature, parse_notifications, apply_notification
+from schemas.job_schemas import BatchJobsRequest
+from utils.codec import dumps, loads
+from utils.invoice_sender import invoice_sender
+from config import settings
 
 router = APIRouter()
 
+async def _stream_customers(first_page: list[dict], pages):
+    yield b"".join(dumps(customer) + b"\n" for customer in first_page)
+    try:
+        async for page in pages:
+            yield b"".join(dumps(customer) + b"\n" for customer in page)
+    except Exception as e:
+        # The 200 is already out: end with an error line so the client can
+        # tell a failed listing from a complete one
+        print("🔴 Customer stream failed mid-way:", e)
+        detail = e.detail if isinstance(e, HTTPException) else "QuickBooks customer query failed"
+        status = e.status_code if isinstance(e, HTTPException) else 502
+        yield dumps({"error": detail, "status_code": status}) + b"\n"
+
 # List or search customers
+#   no params        -> full list from the cached customer directory
+#   q / start / limit -> one page searched server-side in QuickBooks
+#   stream=true      -> NDJSON, one customer per line, emitted page by page;
+#                       a failure after the first page ends the stream with
+#                       an {"error": ..., "status_code": ...} line
+# Both non-streaming modes answer {"customers", "start", "limit", "next_start"}.
 @router.get("/customers")
-async def list_customers(request: Request):
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
-
-    if not qb_access_token or not realm_id:
-        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
-
-    return await search_customers(qb_access_token, realm_id)
+async def list_customers(
+    ctx: RequestContext = Depends(require_qb_context),
+    q: Optional[str] = Query(None, max_length=100),
+    start: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=QB_PAGE_SIZE),
+    stream: bool = False,
+):
+    qb_access_token, realm_id = ctx.qb_access_token, ctx.realm_id
+
+    if stream:
+        pages = iter_customer_pages(qb_access_token, realm_id, q, limit or QB_PAGE_SIZE)
+        # Fetched before the response starts, so an upfront failure keeps its status
+        first_page = await anext(pages, [])
+        return StreamingResponse(_stream_customers(first_page, pages), media_type="application/x-ndjson")
+
+    if q is None and start is None and limit is None:
+        directory = await load_customer_directory(qb_access_token, realm_id)
+        customers = directory.all()
+        return {"customers": customers, "start": 1, "limit": len(customers), "next_start": None}
+
+    start = start or 1
+    limit = limit or 100
+    customers = await search_customers(qb_access_token, realm_id, q, start, limit)
+    return {
+        "customers": customers,
+        "start": start,
+        "limit": limit,
+        "next_start": start + limit if len(customers) == limit else None,
+    }
 
 # Create a new customer
 @router.post("/customers")
-async def create_new_customer(request: Request):
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
-
-    if not qb_access_token or not realm_id:
-        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
-
-    return await create_customer(qb_access_token, realm_id)
+async def create_new_customer(ctx: RequestContext = Depends(require_qb_context)):
+    return await create_customer(ctx.qb_access_token, ctx.realm_id)
 
 # Create or fetch today's invoice, and store selected customer
 @router.get("/customers/{customer_id}/invoices/today")
-async def check_today_invoice(customer_id: str, request: Request):
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
-
-    if not qb_access_token or not realm_id:
-        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
-
-    return await get_today_invoice_only(customer_id, qb_access_token, realm_id)
+async def check_today_invoice(customer_id: str, ctx: RequestContext = Depends(require_qb_context)):
+    return await get_today_invoice_only(customer_id, ctx.qb_access_token, ctx.realm_id)
 
 
 @router.post("/customers/{customer_id}/invoices/today")
 async def create_today_invoice_route(
     customer_id: str,
     request: Request,
-    payload: dict = Body(...)
+    payload: dict = Body(...),
+    ctx: RequestContext = Depends(require_qb_context),
 ):
     verify_csrf(request)
 
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
-
-    if not qb_access_token or not realm_id:
-        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
+    qb_access_token, realm_id = ctx.qb_access_token, ctx.realm_id
 
     qb_id_pattern = re.compile(r"^[a-zA-Z0-9\-]+$")
     if not qb_id_pattern.match(customer_id):
         raise HTTPException(status_code=400, detail="Invalid QuickBooks customer ID format")
 
-    customers = await search_customers(qb_access_token, realm_id)
-    matching_customer = next((c for c in customers if c["Id"] == customer_id), None)
-    if not matching_customer:
+    if not await customer_exists(customer_id, qb_access_token, realm_id):
         raise HTTPException(status_code=404, detail="Customer ID not found in QuickBooks")
 
-    set_current_qb_customer(customer_id, request)
+    await ctx.set_customer(customer_id)
 
     # Extract item info from payload
     item_id = payload.get("item_id")
@@ -102,20 +128,14 @@ async def create_today_invoice_route(
 
 # Get all items (to choose from)
 @router.get("/items")
-async def get_items(request: Request):
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
-
-    if not qb_access_token or not realm_id:
-        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
-
-    items = await get_all_qb_items(qb_access_token, realm_id, request)
-    return {"items": items}
+async def get_items(request: Request, refresh: bool = False, ctx: RequestContext = Depends(require_qb_context)):
+    catalog = await load_item_catalog(ctx.qb_access_token, ctx.realm_id, request, force=refresh)
+    return {"items": catalog.items}
 
 
 # Add job line item to current invoice
 @router.post("/invoices/items")
-async def add_invoice_item(payload: dict = Body(...), request: Request = None):
+async def add_invoice_item(request: Request, payload: dict = Body(...), ctx: RequestContext = Depends(require_qb_context)):
     return await add_job_to_invoice(
         description=payload["description"],
         qty=payload.get("qty", 1),
@@ -124,53 +144,62 @@ async def add_invoice_item(payload: dict = Body(...), request: Request = None):
         request=request
     )
 
+# Add many job lines (possibly across customers) through QuickBooks /batch
+@router.post("/batch/jobs")
+async def add_batch_jobs(payload: BatchJobsRequest, request: Request, ctx: RequestContext = Depends(require_qb_context)):
+    verify_csrf(request)
+    results = await add_jobs_in_batch(payload.jobs, ctx.qb_access_token, ctx.realm_id, request)
+    return {"results": results}
+
 # Get current selected QB customer from session
 @router.get("/session-customer")
-async def get_session_customer(request: Request):
-    customer_id = get_current_qb_customer(request)
-    return {"customer_id": customer_id}
+async def get_session_customer(ctx: RequestContext = Depends(get_request_context)):
+    return {"customer_id": await ctx.get_customer_id()}
 
 # Clear selected customer from session
 @router.post("/reset-customer")
-async def reset_customer(request: Request):
+async def reset_customer(request: Request, ctx: RequestContext = Depends(get_request_context)):
     verify_csrf(request)
-    reset_qb_customer(request)
+    await ctx.reset_customer()
     return {"message": "Customer reset successful"}
 
-# Send invoice to stored customer
-@router.post("/invoices/send")
-async def send_invoice_to_customer(request: Request):
+# Send invoice to stored customer: queued for a background worker, poll the job for the outcome
+@router.post("/invoices/send", status_code=202)
+async def send_invoice_to_customer(request: Request, ctx: RequestContext = Depends(require_qb_context)):
     verify_csrf(request)
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
+    realm_id = ctx.realm_id
 
-    if not all([qb_access_token, realm_id]):
-        raise HTTPException(status_code=401, detail="Missing authentication context.")
-
-    customer_id = get_current_qb_customer(request)
+    customer_id = await ctx.get_customer_id()
     if not customer_id:
         raise HTTPException(status_code=400, detail="No active QuickBooks customer.")
 
-    invoice = await get_today_invoice_only(customer_id, qb_access_token, realm_id)
-    if not invoice:
-        invoice = await create_today_invoice(customer_id, qb_access_token, realm_id)
-    await send_invoice_email(invoice["Id"], qb_access_token, realm_id)
-
+    job = invoice_sender.submit(
+        realm_id,
+        customer_id,
+        lambda: send_today_invoice(customer_id, realm_id),
+    )
     return {
-        "message": f"Invoice {invoice['DocNumber']} sent to customer {customer_id}"
+        "message": f"Invoice for customer {customer_id} queued for sending",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/qb/invoices/send/{job.id}",
     }
 
+@router.get("/invoices/send/{job_id}")
+async def get_invoice_send_status(job_id: str, ctx: RequestContext = Depends(require_qb_context)):
+    job = invoice_sender.get(job_id)
+    if job is None or job.realm_id != ctx.realm_id:
+        raise HTTPException(status_code=404, detail="Send job not found")
+    return job.as_dict()
+
 # Get current invoice for stored session customer
 @router.get("/invoice")
-async def get_today_invoice(request: Request):
-    session_id = get_session_id(request)
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
-
-    if not all([session_id, qb_access_token, realm_id]):
+async def get_today_invoice(ctx: RequestContext = Depends(require_qb_context)):
+    if not ctx.session_id:
         raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
+    qb_access_token, realm_id = ctx.qb_access_token, ctx.realm_id
 
-    customer_id = get_current_qb_customer(request)
+    customer_id = await ctx.get_customer_id()
     if not customer_id:
         raise HTTPException(status_code=400, detail="No active customer found in session")
 
@@ -178,11 +207,25 @@ async def get_today_invoice(request: Request):
 
 
 @router.get("/customers/{customer_id}/invoices")
-async def get_all_invoices(customer_id: str, request: Request):
-    qb_access_token = request.cookies.get("qb_access_token")
-    realm_id = request.cookies.get("qb_realm_id")
+async def get_all_invoices(customer_id: str, ctx: RequestContext = Depends(require_qb_context)):
+    return await get_all_invoices_for_customer(customer_id, ctx.qb_access_token, ctx.realm_id)
 
-    if not qb_access_token or not realm_id:
-        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
 
-    return await get_all_invoices_for_customer(customer_id, qb_access_token, realm_id)
+# Intuit entity-change notifications: invalidate only what changed
+@router.post("/webhooks")
+async def qb_webhooks(request: Request):
+    if not settings.QB_WEBHOOK_VERIFIER_TOKEN:
+        raise HTTPException(status_code=503, detail="QuickBooks webhooks are not configured")
+
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("intuit-signature")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        changes = parse_notifications(loads(body))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed webhook payload")
+
+    for change in changes:
+        apply_notification(*change)
+    return {"received": len(changes)}
@@ -1,25 +1,40 @@
 # app2/routes/vehicle_routes.py
 
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from .auth_routes import get_current_user
-import httpx
+from schemas.vin_schemas import VehicleBatchRequest
+from utils.codec import dumps, read_json
+from utils.http_clients import get_nhtsa_client
+from utils import metrics
+from utils.vin_cache import vin_cache
+from utils.vin_decoder import decode_vin_locally, InvalidVinError
 
 router = APIRouter()
 
 NHTSA_API_URL = "https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/{vin}?format=json"
+NHTSA_BATCH_URL = "https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVINValuesBatch/"
+NHTSA_BATCH_LIMIT = 50
 
-async def fetch_vehicle_data(vin: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(NHTSA_API_URL.format(vin=vin))
-    if response.status_code != 200:
-        raise HTTPException(status_code=502, detail="NHTSA API is unavailable")
+# DecodeVINValuesBatch returns flat keys; map them onto DecodeVin variable names
+BATCH_VARIABLES = {
+    "Make": "Make",
+    "Model": "Model",
+    "ModelYear": "Model Year",
+    "BodyClass": "Body Class",
+    "FuelTypePrimary": "Fuel Type - Primary",
+    "Manufacturer": "Manufacturer Name",
+    "PlantCountry": "Plant Country",
+}
 
-    data = {
-        item["Variable"]: item["Value"]
-        for item in response.json().get("Results", [])
-        if item["Value"]
-    }
+def decode_vin_local(vin: str) -> dict:
+    try:
+        return decode_vin_locally(vin).model_dump()
+    except InvalidVinError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+def map_vehicle_data(vin: str, data: dict) -> dict:
     return {
         "vin": vin,
         "make": data.get("Make"),
@@ -31,9 +46,117 @@ async def fetch_vehicle_data(vin: str):
         "plantCountry": data.get("Plant Country"),
     }
 
+def store_vehicle_data(local: dict, upstream: dict) -> dict:
+    # Nothing useful decoded: remember that too, but only briefly
+    negative = not (upstream["make"] or upstream["year"])
+    vehicle = {key: upstream[key] if upstream[key] is not None else value for key, value in local.items()}
+    vin_cache.put(local["vin"], vehicle, negative=negative)
+    return vehicle
+
+async def fetch_vehicle_data(vin: str):
+    # Rejects malformed VINs before any network round trip
+    local = decode_vin_local(vin)
+
+    cached = vin_cache.get(local["vin"])
+    if cached is not None:
+        return dict(cached)
+
+    upstream = await decode_vin_upstream(local["vin"])
+    return store_vehicle_data(local, upstream)
+
+async def decode_vin_upstream(vin: str):
+    with metrics.upstream("nhtsa.decode") as call:
+        response = await get_nhtsa_client().get(NHTSA_API_URL.format(vin=vin))
+        call.status = response.status_code
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail="NHTSA API is unavailable")
+
+    data = {
+        item["Variable"]: item["Value"]
+        for item in read_json(response).get("Results", [])
+        if item["Value"]
+    }
+
+    return map_vehicle_data(vin, data)
+
+async def decode_vin_batch_upstream(vins: list[str]) -> dict[str, dict]:
+    with metrics.upstream("nhtsa.decode_batch") as call:
+        response = await get_nhtsa_client().post(
+            NHTSA_BATCH_URL,
+            data={"format": "json", "data": ";".join(vins)},
+        )
+        call.status = response.status_code
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail="NHTSA API is unavailable")
+
+    decoded = {}
+    for result in read_json(response).get("Results", []):
+        vin = (result.get("VIN") or "").upper()
+        data = {variable: result[key] for key, variable in BATCH_VARIABLES.items() if result.get(key)}
+        decoded[vin] = map_vehicle_data(vin, data)
+    return decoded
+
+async def _decode_chunk(locals_: list[dict]) -> list[dict]:
+    try:
+        decoded = await decode_vin_batch_upstream([local["vin"] for local in locals_])
+    except HTTPException as e:
+        return [{"vin": local["vin"], "error": e.detail} for local in locals_]
+
+    results = []
+    for local in locals_:
+        upstream = decoded.get(local["vin"])
+        if upstream is None:
+            results.append({"vin": local["vin"], "error": "VIN missing from NHTSA response"})
+        else:
+            results.append(store_vehicle_data(local, upstream))
+    return results
+
+async def stream_vehicle_batch(vins: list[str]):
+    """Yield one NDJSON line per VIN: cache hits and invalid VINs first, then
+    NHTSA results chunk by chunk as each batch call completes."""
+    misses: list[dict] = []
+    seen = set()
+    for raw in vins:
+        try:
+            local = decode_vin_locally(raw).model_dump()
+        except InvalidVinError as e:
+            yield dumps({"vin": raw, "error": str(e)}) + b"\n"
+            continue
+        if local["vin"] in seen:
+            continue
+        seen.add(local["vin"])
+
+        cached = vin_cache.get(local["vin"])
+        if cached is not None:
+            yield dumps(cached) + b"\n"
+        else:
+            misses.append(local)
+
+    tasks = [
+        asyncio.create_task(_decode_chunk(misses[i:i + NHTSA_BATCH_LIMIT]))
+        for i in range(0, len(misses), NHTSA_BATCH_LIMIT)
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            for result in await finished:
+                yield dumps(result) + b"\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+@router.post("/batch")
+async def decode_vehicle_batch(payload: VehicleBatchRequest, user=Depends(get_current_user)):
+    return StreamingResponse(stream_vehicle_batch(payload.vins), media_type="application/x-ndjson")
+
 @router.get("/{vin}")
-async def get_vehicle_by_vin(vin: str, user=Depends(get_current_user)):
+async def get_vehicle_by_vin(vin: str, full: bool = True, user=Depends(get_current_user)):
     if len(vin) != 17:
         raise HTTPException(status_code=400, detail="Invalid VIN format")
 
-    return await fetch_vehicle_data(vin)
\ No newline at end of file
+    if not full:
+        # Make/year/manufacturer/country only: answered from the VIN itself
+        # (or the cache), never from NHTSA
+        local = decode_vin_local(vin)
+        return vin_cache.get(local["vin"]) or local
+
+    return await fetch_vehicle_data(vin)
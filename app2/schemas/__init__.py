@@ -1,5 +1,5 @@
 # app2/schemas/__init__.py
 
 from .invoice_schemas import InvoiceLineBase, InvoiceLineCreate, InvoiceLineResponse
-from .job_schemas import ServiceType, JobBase, JobCreate, JobResponse, JobUpdate
-from .vin_schemas import VehicleResponse
\ No newline at end of file
+from .job_schemas import ServiceType, JobBase, JobCreate, JobResponse, JobUpdate, BatchJobLine, BatchJobsRequest
+from .vin_schemas import VehicleResponse, VehicleBatchRequest
\ No newline at end of file
@@ -1,7 +1,7 @@
 # app2/schemas/job_schemas.py
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from enum import Enum
 
 class ServiceType(str, Enum):
@@ -29,4 +29,14 @@ class JobResponse(JobBase):
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+class BatchJobLine(BaseModel):
+    customer_id: str = Field(..., pattern=r"^[a-zA-Z0-9\-]+$", description="QuickBooks customer Id")
+    service: ServiceType
+    Qty: float = Field(1, gt=0)
+    UnitPrice: float = Field(..., gt=0)
+    description: Optional[str] = Field(None, description="Line description; defaults to the service name")
+
+class BatchJobsRequest(BaseModel):
+    jobs: List[BatchJobLine] = Field(..., min_length=1, max_length=500)
@@ -1,7 +1,7 @@
 # app2/schemas/vin_schemas.py
 
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 
 
 class VehicleResponse(BaseModel):
@@ -12,4 +12,8 @@ class VehicleResponse(BaseModel):
     bodyType: Optional[str]
     fuelType: Optional[str]
     manufacturer: Optional[str]
-    plantCountry: Optional[str]
\ No newline at end of file
+    plantCountry: Optional[str]
+
+
+class VehicleBatchRequest(BaseModel):
+    vins: List[str] = Field(..., min_length=1, max_length=500, description="VINs to decode; duplicates are decoded once")
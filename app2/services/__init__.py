@@ -1,3 +1,6 @@
 # app/services/__init__.py
 
-from .invoice_services import add_job_to_invoice
\ No newline at end of file
+from .invoice_services import add_job_to_invoice, send_today_invoice
+from .customer_services import load_customer_directory, customer_exists
+from .batch_services import add_jobs_in_batch
+from .webhook_services import verify_signature, parse_notifications, apply_notification, start_cdc_poller, stop_cdc_poller, cdc_stats
@@ -0,0 +1,139 @@
+# app2/services/batch_services.py
+
+from contextlib import AsyncExitStack
+from datetime import date
+from fastapi import HTTPException, Request
+from schemas.job_schemas import BatchJobLine
+from config import settings
+from utils import invoice_state
+from utils.qb import build_sales_line, today_invoice_query, update_invoice_lines, resolve_item_id, warm_invoice_index
+from utils.qb_batch import QBBatch, BatchFault
+from utils.invoice_writer import customer_lock, invoice_lock, submit_lines
+from utils.idempotency import in_keyed_request
+
+STALE_OBJECT_CODE = "5010"
+
+
+async def add_jobs_in_batch(jobs: list[BatchJobLine], qb_access_token: str, realm_id: str, request: Request) -> list[dict]:
+    """Add many job lines, possibly across customers, with at most two /batch
+    round trips (after the realm's daily invoice index is warm): one to look
+    up today's invoices we don't already know about, one to create/update
+    every invoice. Returns one result per customer."""
+    item_ids: dict[str, str] = {}
+    for name in dict.fromkeys(job.service.value for job in jobs):
+        # Same lookup as a single job, including the refresh on a catalog miss
+        item_ids[name] = await resolve_item_id(name, qb_access_token, realm_id, request)
+        if not item_ids[name]:
+            raise HTTPException(status_code=400, detail=f"QuickBooks item '{name}' not found.")
+
+    lines_by_customer: dict[str, list[dict]] = {}
+    for job in jobs:
+        item_id = item_ids[job.service.value]
+        line = build_sales_line(item_id, job.description or job.service.value, job.Qty, job.UnitPrice)
+        lines_by_customer.setdefault(job.customer_id, []).append(line)
+
+    # 1) Today's invoice for each customer: the realm's daily index first, one
+    # batch of queries for whatever it cannot answer
+    await warm_invoice_index(qb_access_token, realm_id)
+    invoices: dict[str, dict | None] = {}
+    lookups = QBBatch(qb_access_token, realm_id)
+    pending = {}
+    for customer_id in lines_by_customer:
+        known, cached = invoice_state.lookup_today_invoice(realm_id, customer_id, settings.QB_INVOICE_INDEX_TTL_SECONDS)
+        if known:
+            invoices[customer_id] = cached
+        else:
+            pending[customer_id] = lookups.query(today_invoice_query(customer_id))
+
+    errors: dict[str, str] = {}
+    if pending:
+        await lookups.execute()
+        for customer_id, op in pending.items():
+            try:
+                found = op.result().get("Invoice", []) or []
+            except BatchFault as e:
+                errors[customer_id] = str(e)
+                continue
+            invoices[customer_id] = found[0] if found else None
+            if found:
+                invoice_state.remember_invoice(realm_id, found[0])
+
+    # 2) One write per customer: sparse update of today's invoice, or create it.
+    # Creates hold the customer's lock and updates each invoice's writer lock
+    # (customer locks first, each kind in a fixed order), so they don't race
+    # single-job writes for the same customer or invoice.
+    writes = QBBatch(qb_access_token, realm_id)
+    write_ops = {}
+    async with AsyncExitStack() as locks:
+        active = [customer_id for customer_id in lines_by_customer if customer_id not in errors]
+        for customer_id in sorted(c for c in active if not invoices.get(c)):
+            await locks.enter_async_context(customer_lock(realm_id, customer_id))
+            # A single job may have created it while we waited for the lock
+            known, cached = invoice_state.lookup_today_invoice(realm_id, customer_id, settings.QB_INVOICE_INDEX_TTL_SECONDS)
+            if cached:
+                invoices[customer_id] = cached
+        for invoice_id in sorted({invoices[c]["Id"] for c in active if invoices.get(c)}):
+            await locks.enter_async_context(invoice_lock((realm_id, invoice_id)))
+
+        for customer_id in active:
+            lines = lines_by_customer[customer_id]
+            invoice = invoices.get(customer_id)
+            if invoice:
+                # A single-job write may have landed while we waited for the lock
+                invoice = invoice_state.get_invoice(realm_id, invoice["Id"]) or invoice
+                write_ops[customer_id] = writes.update("Invoice", {
+                    "Id": invoice["Id"],
+                    "SyncToken": invoice.get("SyncToken", "0"),
+                    "Line": (invoice.get("Line") or []) + lines,
+                    "sparse": True,
+                })
+            else:
+                write_ops[customer_id] = writes.create("Invoice", {
+                    "Line": lines,
+                    "CustomerRef": {"value": customer_id},
+                    "TxnDate": date.today().isoformat(),
+                })
+        if write_ops:
+            await writes.execute()
+            # Index new and updated invoices before anyone waiting on the locks looks
+            for op in write_ops.values():
+                try:
+                    invoice_state.remember_invoice(realm_id, op.result())
+                except BatchFault:
+                    pass
+
+    results = []
+    for customer_id, lines in lines_by_customer.items():
+        if customer_id in errors:
+            results.append({"customer_id": customer_id, "lines": len(lines), "error": errors[customer_id]})
+            continue
+
+        op = write_ops[customer_id]
+        try:
+            updated = op.result()
+        except BatchFault as e:
+            if e.code != STALE_OBJECT_CODE:
+                results.append({"customer_id": customer_id, "lines": len(lines), "error": str(e)})
+                continue
+            # Someone else wrote the invoice meanwhile: hand the lines to the
+            # per-invoice writer, which refetches and retries
+            invoice_id = invoices[customer_id]["Id"]
+            invoice_state.forget_invoice(realm_id, invoice_id)
+
+            async def flush(pending: list[dict], invoice_id=invoice_id) -> dict:
+                return await update_invoice_lines(invoice_id, pending, qb_access_token, realm_id)
+
+            try:
+                updated = await submit_lines((realm_id, invoice_id), lines, flush, exclusive=in_keyed_request())
+            except Exception as retry_error:
+                results.append({"customer_id": customer_id, "lines": len(lines), "error": str(retry_error)})
+                continue
+
+        invoice_state.remember_invoice(realm_id, updated)
+        results.append({
+            "customer_id": customer_id,
+            "lines": len(lines),
+            "invoice": {"Id": updated.get("Id"), "DocNumber": updated.get("DocNumber")},
+        })
+
+    return results
@@ -0,0 +1,60 @@
+# app2/services/customer_services.py
+
+from datetime import datetime, timedelta, timezone
+import httpx
+from config import settings
+from utils.qb import fetch_all_customers, fetch_changed_customers
+from utils.customer_directory import CustomerDirectory, get_customer_directory
+from utils import metrics
+
+# QuickBooks only serves ChangeDataCapture for the last 30 days.
+CDC_MAX_AGE = timedelta(days=29)
+
+
+async def load_customer_directory(qb_access_token: str, realm_id: str, force: bool = False) -> CustomerDirectory:
+    """Return the realm's customer directory, syncing it first if it is empty or stale."""
+    directory = get_customer_directory(realm_id)
+    if directory.loaded and not force and not directory.is_stale(settings.QB_CUSTOMER_SYNC_SECONDS):
+        return directory
+
+    async with directory.lock:
+        # Another request may have synced while we waited on the lock
+        if directory.loaded and not force and not directory.is_stale(settings.QB_CUSTOMER_SYNC_SECONDS):
+            return directory
+
+        if directory.loaded and not _too_old_for_cdc(directory.synced_at):
+            try:
+                changed, synced_at = await fetch_changed_customers(qb_access_token, realm_id, directory.synced_at)
+            except httpx.HTTPStatusError as e:
+                print("🔴 QuickBooks CDC sync failed:", e.response.status_code, e.response.text)
+            else:
+                for customer in changed:
+                    directory.upsert(customer)
+                directory.mark_synced(synced_at)
+                return directory
+
+        customers, synced_at = await fetch_all_customers(qb_access_token, realm_id)
+        directory.replace_all(customers, synced_at)
+
+    return directory
+
+
+async def customer_exists(customer_id: str, qb_access_token: str, realm_id: str) -> bool:
+    directory = await load_customer_directory(qb_access_token, realm_id)
+    found = directory.exists(customer_id)
+    metrics.record_cache("customer_directory", found)
+    if found:
+        return True
+    # The customer may have been created in QuickBooks since our last sync
+    directory = await load_customer_directory(qb_access_token, realm_id, force=True)
+    return directory.exists(customer_id)
+
+
+def _too_old_for_cdc(synced_at: str) -> bool:
+    try:
+        since = datetime.fromisoformat(synced_at)
+    except ValueError:
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - since > CDC_MAX_AGE
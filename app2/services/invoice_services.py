@@ -5,42 +5,95 @@ from utils.qb import (
     get_today_invoice_only,
     create_today_invoice,
     append_invoice_line,
-    get_all_qb_items,
+    resolve_item_id,
+    send_invoice_email,
 )
-from utils.session import get_tokens_and_realm_id, get_current_qb_customer
+from utils.invoice_writer import customer_lock
+from utils.qb_token_manager import qb_token_manager
+from utils.pipeline import Pipeline
+from utils.request_context import get_request_context
 
-async def add_job_to_invoice(
+async def add_job_stages(
+    pipeline: Pipeline,
     description: str,
     qty: float,
     rate: float,
     item_name: str,
     request: Request,
-):
-    access_token, realm_id = get_tokens_and_realm_id(request)
-    customer_id = get_current_qb_customer(request)
+    after: tuple[str, ...] = (),
+) -> str:
+    """Register the invoice stages of a job on `pipeline`.
+
+    Item resolution and today's-invoice lookup are independent and run
+    concurrently; the write waits for both, plus any stages named in `after`
+    that must succeed before anything is written. Returns the name of the
+    final stage.
+    """
+    ctx = get_request_context(request)
+    access_token, realm_id = ctx.qb_access_token, ctx.realm_id
+    customer_id = await ctx.get_customer_id()
 
     if not customer_id:
         raise HTTPException(status_code=400, detail="No QuickBooks customer selected.")
 
-    items = await get_all_qb_items(access_token, realm_id, request)
-    matching_item = next((item for item in items if item["Name"] == item_name), None)
+    async def resolve_item():
+        item_id = await resolve_item_id(item_name, access_token, realm_id, request)
+        if not item_id:
+            raise HTTPException(status_code=400, detail=f"QuickBooks item '{item_name}' not found.")
+        return item_id
 
-    if not matching_item:
-        raise HTTPException(status_code=400, detail=f"QuickBooks item '{item_name}' not found.")
+    async def find_invoice():
+        return await get_today_invoice_only(customer_id, access_token, realm_id)
 
-    item_id = matching_item["Id"]
+    async def write_line(item_id: str, invoice: dict, *_after):
+        if not invoice.get("Id"):
+            async with customer_lock(realm_id, customer_id):
+                # A concurrent job may have created it while we waited
+                invoice = await get_today_invoice_only(customer_id, access_token, realm_id)
+                if not invoice.get("Id"):
+                    # No invoice yet today: create it with this job as its first line
+                    return await create_today_invoice(
+                        customer_id=customer_id,
+                        qb_access_token=access_token,
+                        realm_id=realm_id,
+                        item_id=item_id,
+                        description=description,
+                        rate=rate,
+                        qty=qty,
+                    )
+        return await append_invoice_line(
+            invoice_id=invoice["Id"],
+            description=description,
+            qty=qty,
+            rate=rate,
+            item_id=item_id,
+            qb_access_token=access_token,
+            realm_id=realm_id,
+        )
+
+    pipeline.stage("item", resolve_item)
+    pipeline.stage("invoice", find_invoice)
+    pipeline.stage("append", write_line, "item", "invoice", *after)
+    return "append"
+
+async def add_job_to_invoice(
+    description: str,
+    qty: float,
+    rate: float,
+    item_name: str,
+    request: Request,
+):
+    pipeline = Pipeline()
+    final_stage = await add_job_stages(pipeline, description, qty, rate, item_name, request)
+    results = await pipeline.run()
+    return results[final_stage]
 
+async def send_today_invoice(customer_id: str, realm_id: str) -> dict:
+    """Email today's invoice for `customer_id`; run by the background invoice sender."""
+    # Jobs can wait in the queue past the caller's token: use the current one
+    access_token, _ = await qb_token_manager.ensure_valid()
     invoice = await get_today_invoice_only(customer_id, access_token, realm_id)
-    if not invoice:
-        invoice = await create_today_invoice(customer_id, access_token, realm_id)
-
-    result = await append_invoice_line(
-        invoice_id=invoice["Id"],
-        description=description,
-        qty=qty,
-        rate=rate,
-        item_id=item_id,
-        access_token=access_token,
-        realm_id=realm_id,
-    )
-    return result
\ No newline at end of file
+    if not invoice.get("Id"):
+        raise HTTPException(status_code=404, detail=f"No invoice today for customer {customer_id}")
+    await send_invoice_email(invoice["Id"], access_token, realm_id)
+    return {"Id": invoice["Id"], "DocNumber": invoice.get("DocNumber")}
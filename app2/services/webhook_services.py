@@ -0,0 +1,198 @@
+# app2/services/webhook_services.py
+
+import asyncio
+import base64
+import hashlib
+import hmac
+from datetime import date, datetime, timedelta, timezone
+from config import settings
+from utils import invoice_state
+from utils.customer_directory import directory_realms, get_customer_directory
+from utils.item_catalog import catalog_realms, invalidate_item_catalog
+from utils.qb import fetch_changes
+from utils.qb_token_manager import qb_token_manager
+
+# Keeps the customer directory, item catalog and daily invoice index in step
+# with edits made directly in QuickBooks. Webhooks invalidate exactly the
+# entities they name; a periodic ChangeDataCapture poll catches anything a
+# missed or delayed webhook would have told us, and refreshes in place.
+
+CDC_ENTITIES = ["Customer", "Item", "Invoice"]
+
+# CloudEvents verbs ("qbo.invoice.updated.v1") -> the classic envelope's
+# operation names, which is what apply_notification compares against
+CLOUDEVENT_OPERATIONS = {
+    "created": "Create",
+    "updated": "Update",
+    "deleted": "Delete",
+    "merged": "Merge",
+    "voided": "Void",
+    "emailed": "Emailed",
+}
+
+# realm_id -> QuickBooks server time of the last CDC poll
+_cursors: dict[str, str] = {}
+_poller: asyncio.Task | None = None
+_stats = {"polls": 0, "poll_failures": 0, "skipped_cycles": 0, "ignored_notifications": 0}
+
+
+def cdc_stats() -> dict:
+    return dict(_stats)
+
+
+def _cached_realms() -> set[str]:
+    return set(directory_realms()) | set(catalog_realms()) | set(invoice_state.indexed_realms())
+
+
+def verify_signature(body: bytes, signature: str | None) -> bool:
+    """`intuit-signature` is base64(HMAC-SHA256(verifier token, raw body))."""
+    if not signature or not settings.QB_WEBHOOK_VERIFIER_TOKEN:
+        return False
+    digest = hmac.new(settings.QB_WEBHOOK_VERIFIER_TOKEN.encode(), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest).decode(), signature.strip())
+
+
+def parse_notifications(payload) -> list[tuple[str, str, str, str, str]]:
+    """Flatten a webhook payload into
+    (realm_id, entity, entity_id, operation, last_updated).
+
+    Accepts the classic `eventNotifications` envelope and the CloudEvents list
+    (`type` like "qbo.invoice.updated.v1"); both yield the classic operation
+    names ("Create", "Update", "Delete", "Merge", ...).
+    """
+    changes = []
+    if isinstance(payload, dict):
+        for notification in payload.get("eventNotifications", []):
+            realm_id = str(notification.get("realmId", ""))
+            for entity in (notification.get("dataChangeEvent") or {}).get("entities", []):
+                changes.append((
+                    realm_id,
+                    entity.get("name", ""),
+                    str(entity.get("id", "")),
+                    entity.get("operation", ""),
+                    entity.get("lastUpdated", ""),
+                ))
+    elif isinstance(payload, list):
+        for event in payload:
+            parts = str(event.get("type", "")).split(".")
+            if len(parts) >= 3:
+                changes.append((
+                    str(event.get("intuitaccountid", "")),
+                    parts[1].capitalize(),
+                    str(event.get("intuitentityid", "")),
+                    CLOUDEVENT_OPERATIONS.get(parts[2].lower(), parts[2].capitalize()),
+                    event.get("time", ""),
+                ))
+    return [change for change in changes if change[0] and change[2]]
+
+
+def _parse_time(value) -> datetime | None:
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _is_echo(cached: dict, last_updated: str) -> bool:
+    """True when the notification is no newer than our cached copy, e.g.
+    Intuit telling us about an update we made ourselves."""
+    changed_at = _parse_time(last_updated) if last_updated else None
+    cached_at = _parse_time((cached.get("MetaData") or {}).get("LastUpdatedTime", ""))
+    if changed_at is None or cached_at is None or (changed_at.tzinfo is None) != (cached_at.tzinfo is None):
+        return False
+    return changed_at <= cached_at
+
+
+def apply_notification(realm_id: str, entity: str, entity_id: str, operation: str, last_updated: str = ""):
+    # Nothing cached for the realm (or entity) means nothing to invalidate;
+    # don't create empty directory/index entries for it either
+    if entity == "Customer" and realm_id not in directory_realms():
+        _stats["ignored_notifications"] += 1
+        return
+    if entity == "Invoice" and realm_id not in invoice_state.indexed_realms():
+        _stats["ignored_notifications"] += 1
+        return
+
+    if entity == "Customer":
+        directory = get_customer_directory(realm_id)
+        if operation in ("Delete", "Merge"):
+            directory.remove(entity_id)
+        # Next lookup runs one incremental CDC sync instead of trusting the cache
+        directory.dirty = True
+    elif entity == "Item":
+        invalidate_item_catalog(realm_id)
+    elif entity == "Invoice":
+        cached = invoice_state.get_invoice(realm_id, entity_id)
+        if cached is not None:
+            if not _is_echo(cached, last_updated):
+                invoice_state.forget_invoice(realm_id, entity_id)
+        elif operation == "Create":
+            # Possibly today's invoice for a customer the index says has none
+            invoice_state.expire_warm(realm_id)
+
+
+def apply_changes(realm_id: str, changed: dict[str, list[dict]]):
+    directory = get_customer_directory(realm_id)
+    if directory.loaded:
+        for customer in changed.get("Customer", []):
+            directory.upsert(customer)
+    if changed.get("Item"):
+        invalidate_item_catalog(realm_id)
+    today = date.today().isoformat()
+    for invoice in changed.get("Invoice", []):
+        if invoice.get("status") == "Deleted" or invoice.get("TxnDate") != today:
+            invoice_state.forget_invoice(realm_id, invoice.get("Id", ""))
+        else:
+            # Keeps whichever copy has the newer SyncToken
+            invoice_state.remember_invoice(realm_id, invoice)
+
+
+async def poll_changes(realm_id: str, qb_access_token: str):
+    since = _cursors.get(realm_id) or (
+        datetime.now(timezone.utc) - timedelta(seconds=settings.QB_CDC_POLL_SECONDS)
+    ).isoformat(timespec="seconds")
+    changed, server_time = await fetch_changes(qb_access_token, realm_id, CDC_ENTITIES, since, op="qb.cdc.poll")
+    apply_changes(realm_id, changed)
+    _cursors[realm_id] = server_time
+    _stats["polls"] += 1
+    if any(changed.values()):
+        print(f"🔄 CDC poll for realm {realm_id}:", {entity: len(rows) for entity, rows in changed.items()})
+
+
+async def _poll_forever():
+    while True:
+        await asyncio.sleep(settings.QB_CDC_POLL_SECONDS)
+        # Only realms we hold cached data for can go stale
+        realms = _cached_realms()
+        if not realms:
+            continue
+        token = await qb_token_manager.get_access_token()
+        if not token:
+            # The cursors stay put, so the next poll with a token covers the gap
+            _stats["skipped_cycles"] += 1
+            print("⚠️ CDC poll skipped, no QuickBooks access token; realms not checked since:",
+                  {realm_id: _cursors.get(realm_id, "never") for realm_id in realms})
+            continue
+        for realm_id in realms:
+            try:
+                await poll_changes(realm_id, token)
+            except Exception as e:
+                _stats["poll_failures"] += 1
+                print(f"⚠️ CDC poll for realm {realm_id} failed:", e)
+
+
+def start_cdc_poller():
+    global _poller
+    if settings.QB_CDC_POLL_SECONDS > 0 and _poller is None:
+        _poller = asyncio.create_task(_poll_forever())
+
+
+async def stop_cdc_poller():
+    global _poller
+    if _poller is not None:
+        _poller.cancel()
+        try:
+            await _poller
+        except asyncio.CancelledError:
+            pass
+        _poller = None
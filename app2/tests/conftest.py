@@ -0,0 +1,9 @@
+# app2/tests/conftest.py
+
+import os
+import sys
+
+# The app imports its packages top-level (`from utils.x import ...`) and
+# refuses to load settings without a JWT secret
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET", "test-secret")
@@ -0,0 +1,93 @@
+# app2/tests/test_webhook_services.py
+
+from datetime import date
+
+import pytest
+
+from services.webhook_services import apply_notification, parse_notifications
+from utils import invoice_state
+from utils.customer_directory import _directories
+
+REALM = "R1"
+
+
+def classic(operation: str, last_updated: str = "2025-06-01T09:30:00-0700") -> dict:
+    return {"eventNotifications": [{
+        "realmId": REALM,
+        "dataChangeEvent": {"entities": [
+            {"name": "Invoice", "id": "101", "operation": operation, "lastUpdated": last_updated},
+        ]},
+    }]}
+
+
+def cloudevent(verb: str, time: str = "2025-06-01T16:30:00Z") -> list:
+    return [{
+        "type": f"qbo.invoice.{verb}.v1",
+        "intuitaccountid": REALM,
+        "intuitentityid": "101",
+        "time": time,
+    }]
+
+
+@pytest.mark.parametrize("operation, verb", [
+    ("Create", "created"),
+    ("Update", "updated"),
+    ("Delete", "deleted"),
+    ("Merge", "merged"),
+    ("Void", "voided"),
+])
+def test_both_formats_yield_the_same_operation(operation, verb):
+    [from_classic] = parse_notifications(classic(operation))
+    [from_cloudevent] = parse_notifications(cloudevent(verb))
+    assert from_classic[:4] == from_cloudevent[:4] == (REALM, "Invoice", "101", operation)
+
+
+def test_last_updated_is_carried_through():
+    assert parse_notifications(classic("Update"))[0][4] == "2025-06-01T09:30:00-0700"
+    assert parse_notifications(cloudevent("updated"))[0][4] == "2025-06-01T16:30:00Z"
+
+
+@pytest.fixture
+def cached_invoice():
+    invoice = {
+        "Id": "101",
+        "SyncToken": "2",
+        "TxnDate": date.today().isoformat(),
+        "CustomerRef": {"value": "7"},
+        "MetaData": {"LastUpdatedTime": "2025-06-01T09:30:00-07:00"},
+    }
+    invoice_state.remember_invoice(REALM, invoice)
+    yield invoice
+    invoice_state.forget_invoice(REALM, "101")
+
+
+@pytest.mark.parametrize("payload", [classic("Update"), cloudevent("updated")])
+def test_echo_of_our_own_update_keeps_the_cache(cached_invoice, payload):
+    for change in parse_notifications(payload):
+        apply_notification(*change)
+    assert invoice_state.get_invoice(REALM, "101") is not None
+
+
+@pytest.mark.parametrize("payload", [
+    classic("Update", "2025-06-01T09:31:00-0700"),
+    cloudevent("updated", "2025-06-01T16:31:00Z"),
+    classic("Delete", ""),
+])
+def test_newer_change_forgets_the_invoice(cached_invoice, payload):
+    for change in parse_notifications(payload):
+        apply_notification(*change)
+    assert invoice_state.get_invoice(REALM, "101") is None
+
+
+def test_unknown_realm_creates_no_cache_entries():
+    payload = {"eventNotifications": [{
+        "realmId": "R-unknown",
+        "dataChangeEvent": {"entities": [
+            {"name": "Customer", "id": "5", "operation": "Update", "lastUpdated": ""},
+            {"name": "Invoice", "id": "9", "operation": "Create", "lastUpdated": ""},
+        ]},
+    }]}
+    for change in parse_notifications(payload):
+        apply_notification(*change)
+    assert "R-unknown" not in _directories
+    assert "R-unknown" not in invoice_state.indexed_realms()
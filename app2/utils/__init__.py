@@ -4,5 +4,5 @@ from .errors import CustomError
 from .tokens import create_access_token, decode_access_token, generate_csrf_token
 from .csrf import _origin_matches, verify_csrf
 from .session import set_current_qb_customer, get_current_qb_customer, reset_qb_customer, get_session_id, get_tokens_and_realm_id
-from .qb import build_qb_headers, search_customers, get_customer_by_id, create_customer,get_today_invoice_only, create_today_invoice, append_invoice_line, get_all_qb_items, get_item_id_by_name
+from .qb import build_qb_headers, search_customers, get_customer_by_id, create_customer,get_today_invoice_only, create_today_invoice, append_invoice_line, get_all_qb_items, get_item_id_by_name, load_item_catalog, resolve_item_id
 
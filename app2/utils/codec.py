@@ -0,0 +1,49 @@
+# app2/utils/codec.py
+
+import json
+from typing import Any
+import httpx
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+# One JSON codec for the whole app: orjson when installed, stdlib otherwise.
+# Upstream bodies are parsed straight from bytes and memoized on the
+# response, so a QuickBooks/NHTSA body is decoded exactly once however many
+# helpers look at it.
+
+_PARSED = "_parsed_json"
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def read_json(response: httpx.Response) -> Any:
+    """Parse an upstream response body once; later calls return the same object.
+
+    Raises ValueError on a body that is not JSON, like `response.json()`.
+    """
+    parsed = getattr(response, _PARSED, None)
+    if parsed is None:
+        parsed = loads(response.content)
+        setattr(response, _PARSED, parsed)
+    return parsed
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: renders through `dumps` (orjson when available)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,248 @@
+# app2/utils/compression.py
+
+import time
+import zlib
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Response compression for the API. Field devices are bandwidth-bound, so we
+# spend CPU on the best codec the client accepts. Buffered bodies under the
+# size threshold go out as-is; streaming bodies (NDJSON) are compressed chunk
+# by chunk and flushed so each chunk still reaches the client immediately.
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+)
+
+# Server preference when the client weighs several codecs equally
+PREFERENCE = ("br", "zstd", "gzip")
+
+
+class _Stats:
+    def __init__(self):
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.by_encoding: dict[str, int] = {}
+
+    def as_dict(self) -> dict:
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_in / self.bytes_out, 3) if self.bytes_out else None,
+            "cpu_seconds": round(self.cpu_seconds, 4),
+            "by_encoding": dict(self.by_encoding),
+        }
+
+
+stats = _Stats()
+
+
+def compression_stats() -> dict:
+    return stats.as_dict()
+
+
+def available_encodings() -> tuple[str, ...]:
+    return tuple(
+        enc for enc in PREFERENCE
+        if enc == "gzip" or (enc == "br" and brotli is not None) or (enc == "zstd" and zstandard is not None)
+    )
+
+
+def choose_encoding(accept_encoding: str, available: tuple[str, ...]) -> str | None:
+    """Pick the codec with the highest q-value, ties broken by PREFERENCE."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+
+    best, best_q = None, 0.0
+    for enc in available:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+        else:
+            # wbits 31 = gzip container
+            self._obj = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False, finish: bool = False) -> bytes:
+        started = time.thread_time()
+        if self.encoding == "br":
+            out = self._obj.process(data)
+            if finish:
+                out += self._obj.finish()
+            elif flush:
+                out += self._obj.flush()
+        elif self.encoding == "zstd":
+            out = self._obj.compress(data)
+            if finish:
+                out += self._obj.flush()
+            elif flush:
+                out += self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            out = self._obj.compress(data)
+            if finish:
+                out += self._obj.flush()
+            elif flush:
+                out += self._obj.flush(zlib.Z_SYNC_FLUSH)
+        stats.cpu_seconds += time.thread_time() - started
+        stats.bytes_in += len(data)
+        stats.bytes_out += len(out)
+        return out
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing responses under `path_prefix`."""
+
+    def __init__(self, app, path_prefix: str = "/api/", minimum_size: int | None = None):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.available = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        # None: identity, but compressible responses still get Vary
+        encoding = choose_encoding(accept, self.available) if accept else None
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+
+def _with_vary(headers) -> list:
+    """`headers` with Accept-Encoding added to (or as) the Vary header."""
+    out, vary = [], None
+    for name, value in headers:
+        if name == b"vary":
+            vary = value
+            continue
+        out.append((name, value))
+    if vary is None:
+        vary = b"Accept-Encoding"
+    elif b"accept-encoding" not in vary.lower() and vary.strip() != b"*":
+        vary += b", Accept-Encoding"
+    out.append((b"vary", vary))
+    return out
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding: str | None, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.compressor: _Compressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            compressible = self._compressible(message)
+            self.passthrough = not compressible or self.encoding is None
+            if self.passthrough:
+                if compressible:
+                    # Caches must not hand this identity body to a client
+                    # that accepts a compressed one, or the reverse
+                    message = {**message, "headers": _with_vary(message.get("headers", []))}
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body:
+                # Whole body in one message: compress only if worth it
+                if len(body) < self.minimum_size:
+                    stats.skipped += 1
+                    await self.send({**self.start_message, "headers": _with_vary(self.start_message.get("headers", []))})
+                    await self.send(message)
+                    return
+                self._begin()
+                body = self.compressor.compress(body, finish=True)
+                self._set_headers(content_length=len(body))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+
+            # Streaming response: compress and flush chunk by chunk
+            self._begin()
+            self._set_headers(content_length=None)
+            await self.send(self.start_message)
+
+        body = self.compressor.compress(body, flush=more_body, finish=not more_body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _begin(self):
+        self.compressor = _Compressor(self.encoding)
+        stats.compressed += 1
+        stats.by_encoding[self.encoding] = stats.by_encoding.get(self.encoding, 0) + 1
+
+    def _compressible(self, message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        content_type = b""
+        for name, value in message.get("headers", []):
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        content_type = content_type.decode("latin-1").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _set_headers(self, content_length: int | None):
+        headers = [
+            (name, value) for name, value in _with_vary(self.start_message.get("headers", []))
+            if name != b"content-length"
+        ]
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        self.start_message = {**self.start_message, "headers": headers}
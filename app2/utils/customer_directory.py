@@ -0,0 +1,111 @@
+# app2/utils/customer_directory.py
+
+import asyncio
+import time
+
+# Per-realm, in-memory view of QuickBooks customers.
+# Primary index is Id; secondary indexes map normalized display name and
+# primary email back to the Id. QuickBooks only returns active customers from
+# `select * from Customer`, so inactive/deleted ones are dropped on sync.
+
+
+def _norm(value: str | None) -> str:
+    return (value or "").strip().lower()
+
+
+class CustomerDirectory:
+    def __init__(self, realm_id: str):
+        self.realm_id = realm_id
+        self.by_id: dict[str, dict] = {}
+        self.by_name: dict[str, str] = {}
+        self.by_email: dict[str, str] = {}
+        # QuickBooks server time of the last successful sync, used as
+        # `changedSince` for the next incremental (CDC) sync.
+        self.synced_at: str | None = None
+        self.checked_at: float = 0.0
+        self.dirty = False
+        self.lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.synced_at is not None
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def exists(self, customer_id: str) -> bool:
+        return customer_id in self.by_id
+
+    def get(self, customer_id: str) -> dict | None:
+        return self.by_id.get(customer_id)
+
+    def find_by_name(self, display_name: str) -> dict | None:
+        customer_id = self.by_name.get(_norm(display_name))
+        return self.by_id.get(customer_id) if customer_id else None
+
+    def find_by_email(self, email: str) -> dict | None:
+        customer_id = self.by_email.get(_norm(email))
+        return self.by_id.get(customer_id) if customer_id else None
+
+    def all(self) -> list[dict]:
+        return list(self.by_id.values())
+
+    def upsert(self, customer: dict):
+        customer_id = customer.get("Id")
+        if not customer_id:
+            return
+        if customer.get("status") == "Deleted" or customer.get("Active") is False:
+            self.remove(customer_id)
+            return
+
+        self._unindex(customer_id)
+        self.by_id[customer_id] = customer
+        if name := _norm(customer.get("DisplayName")):
+            self.by_name[name] = customer_id
+        if email := _norm((customer.get("PrimaryEmailAddr") or {}).get("Address")):
+            self.by_email[email] = customer_id
+
+    def remove(self, customer_id: str):
+        self._unindex(customer_id)
+        self.by_id.pop(customer_id, None)
+
+    def replace_all(self, customers: list[dict], synced_at: str):
+        self.by_id.clear()
+        self.by_name.clear()
+        self.by_email.clear()
+        for customer in customers:
+            self.upsert(customer)
+        self.mark_synced(synced_at)
+
+    def mark_synced(self, synced_at: str):
+        self.synced_at = synced_at
+        self.checked_at = time.monotonic()
+        self.dirty = False
+
+    def is_stale(self, max_age: float) -> bool:
+        return self.dirty or time.monotonic() - self.checked_at > max_age
+
+    def _unindex(self, customer_id: str):
+        previous = self.by_id.get(customer_id)
+        if not previous:
+            return
+        name = _norm(previous.get("DisplayName"))
+        if self.by_name.get(name) == customer_id:
+            del self.by_name[name]
+        email = _norm((previous.get("PrimaryEmailAddr") or {}).get("Address"))
+        if self.by_email.get(email) == customer_id:
+            del self.by_email[email]
+
+
+_directories: dict[str, CustomerDirectory] = {}
+
+
+def get_customer_directory(realm_id: str) -> CustomerDirectory:
+    directory = _directories.get(realm_id)
+    if directory is None:
+        directory = _directories[realm_id] = CustomerDirectory(realm_id)
+    return directory
+
+
+def directory_realms() -> list[str]:
+    return [realm_id for realm_id, directory in _directories.items() if directory.loaded]
@@ -0,0 +1,66 @@
+# app2/utils/http_clients.py
+
+import logging
+import importlib.util
+import httpx
+from config import settings
+
+# One long-lived, pooled client per upstream so requests reuse warm
+# TCP/TLS connections (multiplexed over HTTP/2 where the upstream allows it).
+QB_API = "qb"
+QB_OAUTH = "qb_oauth"
+NHTSA = "nhtsa"
+
+UPSTREAMS = (QB_API, QB_OAUTH, NHTSA)
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.HTTP2_ENABLED and HTTP2_AVAILABLE
+    if settings.HTTP2_ENABLED and not HTTP2_AVAILABLE:
+        logging.warning("HTTP/2 requested but 'h2' is not installed; falling back to HTTP/1.1")
+
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+
+async def init_http_clients():
+    for name in UPSTREAMS:
+        if name not in _clients:
+            _clients[name] = _build_client()
+    logging.info("🌐 HTTP clients ready (%s)", ", ".join(UPSTREAMS))
+
+
+async def close_http_clients():
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    # Lazily create the client if the startup hook has not run
+    # (e.g. scripts importing utils directly).
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client()
+    return client
+
+
+def get_qb_client() -> httpx.AsyncClient:
+    return get_client(QB_API)
+
+
+def get_qb_oauth_client() -> httpx.AsyncClient:
+    return get_client(QB_OAUTH)
+
+
+def get_nhtsa_client() -> httpx.AsyncClient:
+    return get_client(NHTSA)
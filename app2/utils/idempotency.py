@@ -0,0 +1,212 @@
+# app2/utils/idempotency.py
+
+import asyncio
+import hashlib
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import settings
+from utils.cache import TTLCache
+
+# Idempotency-Key support for write endpoints. The first successful (2xx)
+# response for a key is stored and replayed byte for byte to every retry; a
+# retry arriving while the original is still running waits for it instead of
+# running again (an error response is not stored, so a retry after it runs
+# for real). Keys are
+# scoped to the caller and the endpoint, and reusing a key with a different
+# body is rejected.
+#
+# While a keyed request runs, its QuickBooks writes carry a `requestid` derived
+# from the key, so QuickBooks itself de-duplicates a write whose response we
+# never saw (e.g. the connection dropped after QuickBooks committed it).
+
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = (b"idempotent-replayed", b"true")
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "status", "headers", "body")
+
+    def __init__(self, fingerprint: str, status: int, headers: list, body: bytes):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _RequestIds:
+    """Deterministic QuickBooks requestids for the writes of one keyed request:
+    the n-th write of a given operation with the same payload always gets the
+    same id.
+
+    The payload is part of the id because QuickBooks replays whatever it first
+    answered for a requestid, faults included. A retry that sends the same
+    body is de-duplicated; one whose body changed (e.g. a stale-SyncToken
+    retry that refetched the invoice) is a new write with a fresh id, and is
+    not stuck on the original failure.
+    """
+
+    def __init__(self, scope_key: str):
+        self.scope_key = scope_key
+        self.counts: dict[str, int] = {}
+
+    def next(self, op: str, payload: bytes = b"") -> str:
+        n = self.counts.get(op, 0)
+        self.counts[op] = n + 1
+        digest = hashlib.sha256(f"{self.scope_key}|{op}|{n}|".encode() + payload)
+        # QuickBooks caps requestid at 50 characters
+        return digest.hexdigest()[:40]
+
+
+_request_ids: ContextVar[_RequestIds | None] = ContextVar("qb_request_ids", default=None)
+
+
+@contextmanager
+def qb_request_ids(scope_key: str):
+    """Give the QuickBooks writes made inside the block requestids derived
+    from `scope_key`, the same ones every time the block is re-run."""
+    token = _request_ids.set(_RequestIds(scope_key))
+    try:
+        yield
+    finally:
+        _request_ids.reset(token)
+
+
+def in_keyed_request() -> bool:
+    """True while handling a request that carries an Idempotency-Key."""
+    return _request_ids.get() is not None
+
+
+def next_qb_request_id(op: str, payload: bytes = b"") -> str | None:
+    """requestid for the next QuickBooks write in the current keyed request, if any."""
+    ids = _request_ids.get()
+    return ids.next(op, payload) if ids is not None else None
+
+
+_completed = TTLCache(maxsize=settings.IDEMPOTENCY_MAX_ENTRIES, ttl=settings.IDEMPOTENCY_TTL_SECONDS)
+_in_flight: dict[str, asyncio.Future] = {}
+_stats = {"executed": 0, "replayed": 0, "joined": 0, "conflicts": 0}
+
+
+def idempotency_stats() -> dict:
+    return {**_stats, "stored": len(_completed), "in_flight": len(_in_flight)}
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware honoring `Idempotency-Key` on the given
+    (method, path regex) routes. Must run inside RequestContextMiddleware."""
+
+    def __init__(self, app, routes: list[tuple[str, str]]):
+        self.app = app
+        self.routes = [(method, re.compile(pattern)) for method, pattern in routes]
+
+    def _applies(self, scope) -> bool:
+        return any(scope["method"] == method and pattern.fullmatch(scope["path"]) for method, pattern in self.routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                key = value.decode("latin-1").strip()
+                break
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, b'{"detail":"Idempotency-Key is too long"}')
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        scope_key = _scope_key(scope, key)
+
+        while True:
+            entry = _completed.get(scope_key)
+            if entry is not None or scope_key not in _in_flight:
+                break
+            _stats["joined"] += 1
+            # None when the original failed; then this request runs for real
+            entry = await asyncio.shield(_in_flight[scope_key])
+            if entry is not None:
+                break
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                _stats["conflicts"] += 1
+                await _send_json(send, 422, b'{"detail":"Idempotency-Key was already used with a different request"}')
+                return
+            _stats["replayed"] += 1
+            await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers + [REPLAY_HEADER]})
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        # First execution: run it, teeing the response into the store
+        future = _in_flight[scope_key] = asyncio.get_running_loop().create_future()
+        _stats["executed"] += 1
+        captured = {"status": 500, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                captured["body"].append(message.get("body", b""))
+            await send(message)
+
+        token = _request_ids.set(_RequestIds(scope_key))
+        entry = None
+        try:
+            await self.app(scope, _replay_receive(body, receive), capture)
+            # Only successes are final; after an error the client may retry
+            # (or correct) the request under the same key
+            if 200 <= captured["status"] < 300:
+                entry = _Entry(fingerprint, captured["status"], captured["headers"], b"".join(captured["body"]))
+                _completed.set(scope_key, entry)
+        finally:
+            _request_ids.reset(token)
+            _in_flight.pop(scope_key, None)
+            future.set_result(entry)
+
+
+def _scope_key(scope, key: str) -> str:
+    ctx = scope.get("state", {}).get("ctx")
+    caller = (getattr(ctx, "jwt_token", None) or getattr(ctx, "session_id", None) or "") if ctx else ""
+    caller_digest = hashlib.sha256(caller.encode()).hexdigest()[:16]
+    return f"{caller_digest}:{scope['method']}:{scope['path']}:{key}"
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _replay_receive(body: bytes, receive):
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+async def _send_json(send, status: int, body: bytes):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,168 @@
+# app2/utils/invoice_sender.py
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+import httpx
+from fastapi import HTTPException
+from config import settings
+from utils.cache import TTLCache
+from utils.idempotency import qb_request_ids
+from utils.rate_limit import retry_delay
+
+# In-process background pool for invoice emails. The send route enqueues a job
+# and answers 202 straight away; a fixed number of workers run the jobs, retry
+# transient failures (5xx, 429, network errors) with backoff, and record the
+# outcome so the client can poll it by job id. A second send for a customer
+# whose job is still queued or running gets that job back instead of a new one.
+# Jobs live in memory only: shutdown waits up to QB_SEND_DRAIN_SECONDS for the
+# queue to empty, and whatever is still unfinished after that is lost.
+#
+# Every attempt of a job sends the same QuickBooks `requestid` (derived from
+# the job id), so retrying a send whose response was lost -- a 5xx or a dropped
+# connection after QuickBooks acted -- cannot email the customer twice.
+
+SendFn = Callable[[], Awaitable[dict]]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class SendJob:
+    def __init__(self, realm_id: str, customer_id: str, send: SendFn):
+        self.id = uuid.uuid4().hex
+        self.realm_id = realm_id
+        self.customer_id = customer_id
+        self.send = send
+        self.status = "queued"
+        self.attempts = 0
+        self.invoice: dict | None = None
+        self.error: str | None = None
+        self.created_at = self.updated_at = _now()
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "customer_id": self.customer_id,
+            "attempts": self.attempts,
+            "invoice": self.invoice,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def set_status(self, status: str):
+        self.status = status
+        self.updated_at = _now()
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, HTTPException):
+        return e.status_code >= 500 or e.status_code == 429
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return isinstance(e, httpx.TransportError)
+
+
+def _describe(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"QuickBooks returned {e.response.status_code}"
+    return str(e) or e.__class__.__name__
+
+
+class InvoiceSender:
+    def __init__(self, workers: int, max_attempts: int, job_ttl: float, drain_timeout: float = 0):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.drain_timeout = drain_timeout
+        self.jobs = TTLCache(maxsize=10000, ttl=job_ttl)
+        self.counts = {"sent": 0, "failed": 0, "retried": 0}
+        # (realm_id, customer_id) -> unfinished job
+        self._active: dict[tuple[str, str], SendJob] = {}
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        if self._tasks and self._active and self.drain_timeout > 0:
+            print(f"⏳ Waiting up to {self.drain_timeout}s for {len(self._active)} invoice send job(s)")
+            try:
+                await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+        # Workers drop their job from _active as they are cancelled
+        unfinished = list(self._active.values())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if unfinished:
+            print(f"⚠️ {len(unfinished)} invoice send job(s) dropped at shutdown:", [job.id for job in unfinished])
+        self._active.clear()
+
+    def submit(self, realm_id: str, customer_id: str, send: SendFn) -> SendJob:
+        active = self._active.get((realm_id, customer_id))
+        if active is not None:
+            return active
+        self.start()
+        job = SendJob(realm_id, customer_id, send)
+        self.jobs.set(job.id, job)
+        self._active[(realm_id, customer_id)] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> SendJob | None:
+        return self.jobs.get(job_id, count=False)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._active.pop((job.realm_id, job.customer_id), None)
+                self._queue.task_done()
+
+    async def _run(self, job: SendJob):
+        while True:
+            job.attempts += 1
+            job.set_status("running")
+            try:
+                with qb_request_ids(f"invoice-send:{job.id}"):
+                    job.invoice = await job.send()
+            except Exception as e:
+                job.error = _describe(e)
+                if not _retryable(e) or job.attempts >= self.max_attempts:
+                    print(f"🔴 Invoice send job {job.id} failed after {job.attempts} attempt(s):", job.error)
+                    job.set_status("failed")
+                    self.counts["failed"] += 1
+                    return
+                self.counts["retried"] += 1
+                job.set_status("retrying")
+                await asyncio.sleep(retry_delay(job.attempts - 1, None))
+            else:
+                job.error = None
+                job.set_status("sent")
+                self.counts["sent"] += 1
+                return
+
+
+invoice_sender = InvoiceSender(
+    workers=settings.QB_SEND_WORKERS,
+    max_attempts=settings.QB_SEND_MAX_ATTEMPTS,
+    job_ttl=settings.QB_SEND_JOB_TTL_SECONDS,
+    drain_timeout=settings.QB_SEND_DRAIN_SECONDS,
+)
@@ -0,0 +1,148 @@
+# app2/utils/invoice_state.py
+
+import asyncio
+import time
+from datetime import date
+
+# Last known state (Id, DocNumber, SyncToken, Line, ...) of each customer's
+# invoice for the current day, per realm. Every QuickBooks invoice response we
+# see is recorded here, so a line append can go straight to the sparse update
+# without re-reading the invoice first. Entries for earlier days are dropped
+# when the date rolls over.
+#
+# A realm is "warm" once all of today's invoices have been loaded with one
+# query; from then on a customer missing from the index has no invoice today
+# and needs no lookup of its own, until the warm-up expires.
+
+_today: str = ""
+# (realm_id, customer_id) -> invoice
+_by_customer: dict[tuple[str, str], dict] = {}
+# (realm_id, invoice_id) -> customer_id
+_by_invoice: dict[tuple[str, str], str] = {}
+# realm_id -> monotonic time of the last full load of today's invoices
+_warmed_at: dict[str, float] = {}
+# Customers whose invoice was forgotten in a warm realm: a miss is not authoritative
+_unknown: set[tuple[str, str]] = set()
+_warm_locks: dict[str, asyncio.Lock] = {}
+
+
+def _roll_over() -> str:
+    global _today
+    today = date.today().isoformat()
+    if today != _today:
+        _today = today
+        _by_customer.clear()
+        _by_invoice.clear()
+        _warmed_at.clear()
+        _unknown.clear()
+    return today
+
+
+def get_today_invoice(realm_id: str, customer_id: str) -> dict | None:
+    _roll_over()
+    return _by_customer.get((realm_id, customer_id))
+
+
+def lookup_today_invoice(realm_id: str, customer_id: str, ttl: float) -> tuple[bool, dict | None]:
+    """`(known, invoice)`: known is True when the index can answer on its own,
+    either with the invoice or, in a warm realm, with "none today"."""
+    invoice = get_today_invoice(realm_id, customer_id)
+    if invoice is not None:
+        return True, invoice
+    return is_warm(realm_id, ttl) and (realm_id, customer_id) not in _unknown, None
+
+
+def is_warm(realm_id: str, ttl: float) -> bool:
+    _roll_over()
+    warmed_at = _warmed_at.get(realm_id)
+    return warmed_at is not None and time.monotonic() - warmed_at < ttl
+
+
+def warm_lock(realm_id: str) -> asyncio.Lock:
+    lock = _warm_locks.get(realm_id)
+    if lock is None:
+        lock = _warm_locks[realm_id] = asyncio.Lock()
+    return lock
+
+
+def load_day(realm_id: str, day: str, invoices: list[dict]):
+    """Record the result of a full `TxnDate = day` query and mark the realm warm."""
+    if _roll_over() != day:
+        return
+    # Oldest first, so the latest invoice of a customer ends up indexed
+    for invoice in sorted(invoices, key=_created):
+        remember_invoice(realm_id, invoice)
+    _warmed_at[realm_id] = time.monotonic()
+
+
+def expire_warm(realm_id: str):
+    """Stop trusting misses for the realm until today's invoices are reloaded."""
+    _warmed_at.pop(realm_id, None)
+
+
+def indexed_realms() -> list[str]:
+    _roll_over()
+    return list({realm_id for realm_id, _ in _by_customer} | set(_warmed_at))
+
+
+def index_size() -> dict[str, int]:
+    _roll_over()
+    sizes: dict[str, int] = {}
+    for realm_id, _ in _by_customer:
+        sizes[realm_id] = sizes.get(realm_id, 0) + 1
+    return sizes
+
+
+def get_invoice(realm_id: str, invoice_id: str) -> dict | None:
+    _roll_over()
+    customer_id = _by_invoice.get((realm_id, invoice_id))
+    return _by_customer.get((realm_id, customer_id)) if customer_id else None
+
+
+def remember_invoice(realm_id: str, invoice: dict):
+    """Record a full Invoice object returned by QuickBooks (if it is today's)."""
+    today = _roll_over()
+    invoice_id = invoice.get("Id")
+    customer_id = (invoice.get("CustomerRef") or {}).get("value")
+    if not invoice_id or not customer_id or invoice.get("TxnDate") != today:
+        return
+
+    previous = _by_customer.get((realm_id, customer_id))
+    if previous:
+        # Never let an older response overwrite a newer SyncToken, nor an
+        # older invoice of the same customer replace a newer one
+        if previous.get("Id") == invoice_id and _sync_token(previous) > _sync_token(invoice):
+            return
+        if previous.get("Id") != invoice_id and _created(invoice) and _created(previous) > _created(invoice):
+            return
+        _by_invoice.pop((realm_id, previous.get("Id")), None)
+    _by_customer[(realm_id, customer_id)] = invoice
+    _by_invoice[(realm_id, invoice_id)] = customer_id
+    _unknown.discard((realm_id, customer_id))
+
+
+def forget_invoice(realm_id: str, invoice_id: str):
+    customer_id = _by_invoice.pop((realm_id, invoice_id), None)
+    if customer_id:
+        _by_customer.pop((realm_id, customer_id), None)
+        if realm_id in _warmed_at:
+            _unknown.add((realm_id, customer_id))
+
+
+def forget_realm(realm_id: str):
+    for key in [key for key in _by_invoice if key[0] == realm_id]:
+        forget_invoice(*key)
+    _warmed_at.pop(realm_id, None)
+    for key in [key for key in _unknown if key[0] == realm_id]:
+        _unknown.discard(key)
+
+
+def _created(invoice: dict) -> str:
+    return (invoice.get("MetaData") or {}).get("CreateTime") or ""
+
+
+def _sync_token(invoice: dict) -> int:
+    try:
+        return int(invoice.get("SyncToken") or 0)
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,120 @@
+# app2/utils/invoice_writer.py
+
+import asyncio
+import contextvars
+import weakref
+from typing import Any, Awaitable, Callable, Hashable
+
+# Per-invoice write queue. Lines submitted for the same invoice are applied by
+# a single flusher, one update at a time (so concurrent writers never race on
+# SyncToken), and everything that arrives while the previous update is in
+# flight -- or, once two writers are queued, within the coalescing window --
+# goes out as one sparse update.
+# Each caller gets the shared result of the update that carried its lines.
+#
+# Every flush holds the invoice's lock; other writers of the same invoice
+# (the /batch path) take it too, so no two updates race on one SyncToken.
+# Creating a customer's first invoice of the day is serialized the same way
+# by customer_lock. Where both are held, the customer lock is taken first.
+#
+# A flush runs in the context of the caller whose flush function it uses, so
+# per-request state (the QuickBooks requestid of an Idempotency-Key request)
+# belongs to that caller. `exclusive` submissions are never coalesced: their
+# lines go out alone, under their own requestid.
+
+FlushFn = Callable[[list[dict]], Awaitable[Any]]
+
+
+class _Pending:
+    __slots__ = ("lines", "flush", "future", "context", "exclusive")
+
+    def __init__(self, lines: list[dict], flush: FlushFn, future: asyncio.Future, exclusive: bool):
+        self.lines = lines
+        self.flush = flush
+        self.future = future
+        self.context = contextvars.copy_context()
+        self.exclusive = exclusive
+
+
+class _InvoiceQueue:
+    def __init__(self):
+        self.pending: list[_Pending] = []
+        self.flusher: asyncio.Task | None = None
+
+
+_queues: dict[Hashable, _InvoiceQueue] = {}
+# Dropped automatically once no writer holds or waits on a lock
+_locks: "weakref.WeakValueDictionary[Hashable, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def invoice_lock(key: Hashable) -> asyncio.Lock:
+    lock = _locks.get(key)
+    if lock is None:
+        lock = _locks[key] = asyncio.Lock()
+    return lock
+
+
+def customer_lock(realm_id: str, customer_id: str) -> asyncio.Lock:
+    return invoice_lock(("customer", realm_id, customer_id))
+
+
+async def submit_lines(
+    key: Hashable,
+    lines: list[dict],
+    flush: FlushFn,
+    window: float = 0.0,
+    exclusive: bool = False,
+) -> Any:
+    queue = _queues.get(key)
+    if queue is None:
+        queue = _queues[key] = _InvoiceQueue()
+
+    future = asyncio.get_running_loop().create_future()
+    queue.pending.append(_Pending(lines, flush, future, exclusive))
+    if queue.flusher is None:
+        queue.flusher = asyncio.create_task(_drain(key, queue, window))
+    # shield: a caller going away must not cancel the update other callers share
+    return await asyncio.shield(future)
+
+
+async def _drain(key: Hashable, queue: _InvoiceQueue, window: float):
+    try:
+        while queue.pending:
+            # Wait for more lines only once a second writer has shown up; a
+            # lone (or exclusive) submission goes out straight away
+            if window > 0 and len(queue.pending) > 1 and not queue.pending[0].exclusive:
+                await asyncio.sleep(window)
+            batch, queue.pending = _take_batch(queue.pending)
+
+            lines = [line for pending in batch for line in pending.lines]
+            # The most recent caller's flush carries the freshest access token
+            last = batch[-1]
+            try:
+                async with invoice_lock(key):
+                    result = await asyncio.create_task(last.flush(lines), context=last.context)
+            except Exception as e:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+            else:
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_result(result)
+    finally:
+        queue.flusher = None
+        if not queue.pending:
+            _queues.pop(key, None)
+
+
+def _take_batch(pending: list[_Pending]) -> tuple[list[_Pending], list[_Pending]]:
+    """Split off the next update: one exclusive submission on its own, or
+    every non-exclusive submission up to the next exclusive one."""
+    if pending[0].exclusive:
+        n = 1
+    else:
+        n = next((i for i, entry in enumerate(pending) if entry.exclusive), len(pending))
+    return pending[:n], pending[n:]
+
+
+def queue_depth() -> int:
+    return sum(len(queue.pending) for queue in _queues.values())
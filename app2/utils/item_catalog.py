@@ -0,0 +1,54 @@
+# app2/utils/item_catalog.py
+
+import asyncio
+import time
+
+# Per-realm cache of the QuickBooks item list with a name -> Id index, so
+# resolving a ServiceType to an ItemRef is a dict lookup in the steady state.
+
+
+class ItemCatalog:
+    def __init__(self, realm_id: str):
+        self.realm_id = realm_id
+        self.items: list[dict] = []
+        self.by_id: dict[str, dict] = {}
+        self.by_name: dict[str, str] = {}
+        self.loaded_at: float | None = None
+        self.lock = asyncio.Lock()
+
+    def is_fresh(self, ttl: float) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < ttl
+
+    def load(self, items: list[dict]):
+        self.items = items
+        self.by_id = {item["Id"]: item for item in items if item.get("Id")}
+        self.by_name = {item["Name"]: item["Id"] for item in items if item.get("Name") and item.get("Id")}
+        self.loaded_at = time.monotonic()
+
+    def find_id(self, name: str) -> str | None:
+        return self.by_name.get(name)
+
+    def invalidate(self):
+        self.loaded_at = None
+
+
+_catalogs: dict[str, ItemCatalog] = {}
+
+
+def get_item_catalog(realm_id: str) -> ItemCatalog:
+    catalog = _catalogs.get(realm_id)
+    if catalog is None:
+        catalog = _catalogs[realm_id] = ItemCatalog(realm_id)
+    return catalog
+
+
+def invalidate_item_catalog(realm_id: str | None = None):
+    if realm_id is None:
+        for catalog in _catalogs.values():
+            catalog.invalidate()
+    elif realm_id in _catalogs:
+        _catalogs[realm_id].invalidate()
+
+
+def catalog_realms() -> list[str]:
+    return [realm_id for realm_id, catalog in _catalogs.items() if catalog.loaded_at is not None]
@@ -0,0 +1,176 @@
+# app2/utils/metrics.py
+
+import time
+from bisect import bisect_left
+
+# Minimal in-process metrics rendered in the Prometheus text format.
+# Everything is a dict lookup plus an increment on the hot path; label
+# cardinality is bounded by using route templates and named upstream
+# operations rather than raw paths.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+http_requests: dict[tuple[str, str, str], int] = {}
+http_durations: dict[tuple[str, str], Histogram] = {}
+http_in_flight = 0
+
+upstream_requests: dict[tuple[str, str], int] = {}
+upstream_durations: dict[str, Histogram] = {}
+upstream_in_flight: dict[str, int] = {}
+
+cache_requests: dict[tuple[str, str], int] = {}
+
+
+def _inc(counter: dict, key, amount: int = 1):
+    counter[key] = counter.get(key, 0) + amount
+
+
+def _histogram(table: dict, key) -> Histogram:
+    histogram = table.get(key)
+    if histogram is None:
+        histogram = table[key] = Histogram()
+    return histogram
+
+
+def record_cache(cache: str, hit: bool):
+    _inc(cache_requests, (cache, "hit" if hit else "miss"))
+
+
+class upstream:
+    """Time one outbound call: `with upstream("qb.invoice.update") as call: ...; call.status = r.status_code`.
+
+    Exceptions are recorded with status "error".
+    """
+
+    __slots__ = ("op", "status", "started")
+
+    def __init__(self, op: str):
+        self.op = op
+        self.status: int | str = "unknown"
+
+    def __enter__(self) -> "upstream":
+        _inc(upstream_in_flight, self.op)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        upstream_in_flight[self.op] -= 1
+        status = "error" if exc_type is not None else str(self.status)
+        _inc(upstream_requests, (self.op, status))
+        _histogram(upstream_durations, self.op).observe(elapsed)
+        return False
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording count, status and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        global http_in_flight
+        status = 500
+        started = time.perf_counter()
+        http_in_flight += 1
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight -= 1
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or "unmatched"
+            method = scope["method"]
+            _inc(http_requests, (path, method, str(status)))
+            _histogram(http_durations, (path, method)).observe(elapsed)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Exposition:
+    """Builds the text exposition; each metric family is written once with HELP/TYPE."""
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def family(self, name: str, kind: str, help_text: str, samples):
+        """`samples` is an iterable of (labels dict, value)."""
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(**labels)} {value}")
+
+    def histograms(self, name: str, help_text: str, table: dict, label_names: tuple[str, ...]):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for key, histogram in table.items():
+            key = key if isinstance(key, tuple) else (key,)
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                self.lines.append(f"{name}_bucket{_labels(**labels, le=le)} {cumulative}")
+            self.lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+            self.lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def core_exposition() -> Exposition:
+    out = Exposition()
+    out.family(
+        "pk_http_requests_total", "counter", "HTTP requests by route template, method and status.",
+        ((dict(route=r, method=m, status=s), n) for (r, m, s), n in http_requests.items()),
+    )
+    out.histograms("pk_http_request_duration_seconds", "HTTP request latency.", http_durations, ("route", "method"))
+    out.family("pk_http_requests_in_flight", "gauge", "HTTP requests being served.", [({}, http_in_flight)])
+    out.family(
+        "pk_upstream_requests_total", "counter", "Outbound QuickBooks/NHTSA calls by operation and status.",
+        ((dict(op=op, status=s), n) for (op, s), n in upstream_requests.items()),
+    )
+    out.histograms("pk_upstream_duration_seconds", "Outbound call latency by operation.", upstream_durations, ("op",))
+    out.family(
+        "pk_upstream_in_flight", "gauge", "Outbound calls in progress by operation.",
+        ((dict(op=op), n) for op, n in upstream_in_flight.items()),
+    )
+    out.family(
+        "pk_cache_requests_total", "counter", "Cache lookups by cache and result.",
+        ((dict(cache=c, result=r), n) for (c, r), n in cache_requests.items()),
+    )
+    return out
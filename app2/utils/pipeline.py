@@ -0,0 +1,60 @@
+# app2/utils/pipeline.py
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+# Tiny dependency-aware async runner: every stage starts as soon as the
+# stages it depends on have finished, so independent work overlaps and the
+# total latency is the longest chain rather than the sum of all stages.
+
+
+class Pipeline:
+    def __init__(self):
+        self._stages: dict[str, tuple[Callable[..., Awaitable[Any]], tuple[str, ...]]] = {}
+        self.timings: dict[str, float] = {}
+        self.total: float = 0.0
+
+    def stage(self, name: str, fn: Callable[..., Awaitable[Any]], *deps: str) -> "Pipeline":
+        """Register `fn(*dep_results)` to run once all `deps` have completed."""
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (fn, deps)
+        return self
+
+    async def run(self) -> dict[str, Any]:
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str):
+            fn, deps = self._stages[name]
+            args = [await tasks[dep] for dep in deps]
+            started = time.perf_counter()
+            try:
+                return await fn(*args)
+            finally:
+                self.timings[name] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        # Stages can only depend on earlier ones, so creation order is safe
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            # Let the cancelled stages unwind (and retrieve their errors)
+            # before the caller sees the failure
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        finally:
+            self.total = (time.perf_counter() - started) * 1000
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    def server_timing(self) -> str:
+        """Render timings as a `Server-Timing` header value (milliseconds)."""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.timings.items()]
+        parts.append(f"total;dur={self.total:.1f}")
+        return ", ".join(parts)
@@ -1,20 +1,32 @@
 # app2/utils/qb/py
 
-import os
-import base64
+import time
 import httpx
 from fastapi import HTTPException
-from datetime import date
+from datetime import date, datetime, timezone
 from urllib.parse import quote
 from utils.session import get_tokens_and_realm_id
 from fastapi import Request
 from config import settings
+from utils.http_clients import get_qb_client
+from utils.qb_token_manager import qb_token_manager
+from utils.customer_directory import get_customer_directory
+from utils.item_catalog import ItemCatalog, get_item_catalog
+from utils import invoice_state
+from utils.invoice_writer import submit_lines
+from utils.rate_limit import get_governor, retry_delay
+from utils.codec import dumps, read_json
+from utils.idempotency import in_keyed_request, next_qb_request_id
+from utils import metrics
 
 QB_BASE = (
-    "https://sandbox-quickbooks.api.intuit.com/v3/company"
-    if settings.QB_ENVIRONMENT == "sandbox"
-    else "https://quickbooks.api.intuit.com/v3/company"
-)
+    settings.QB_BASE_URL
+    or (
+        "https://sandbox-quickbooks.api.intuit.com"
+        if settings.QB_ENVIRONMENT == "sandbox"
+        else "https://quickbooks.api.intuit.com"
+    )
+).rstrip("/") + "/v3/company"
 
 def build_qb_headers(qb_access_token: str) -> dict:
     return {
@@ -25,67 +37,191 @@ def build_qb_headers(qb_access_token: str) -> dict:
 
 
 async def refresh_qb_tokens() -> tuple[str, str]:
-    refresh_token = os.getenv("QB_REFRESH_TOKEN")
-    client_id = os.getenv("QB_CLIENT_ID")
-    client_secret = os.getenv("QB_CLIENT_SECRET")
+    """Return a valid (access, refresh) token pair, refreshing only if needed."""
+    return await qb_token_manager.ensure_valid()
 
-    if not refresh_token or not client_id or not client_secret:
-        raise HTTPException(status_code=500, detail="Missing QuickBooks credentials")
 
-    auth = f"{client_id}:{client_secret}".encode()
-    headers = {
-        "Authorization": f"Basic {base64.b64encode(auth).decode()}",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "application/json",
-    }
+async def qb_request(
+    method: str,
+    url: str,
+    qb_access_token: str | None,
+    *,
+    params=None,
+    json=None,
+    data=None,
+    op: str | None = None,
+) -> httpx.Response:
+    """Single choke point for QuickBooks API calls on the shared client.
+
+    Every call waits for a slot in its realm's rate limiter, backs off and
+    retries on 429 (honoring Retry-After), swaps in the current access token
+    if the given one has been superseded, and on a 401 refreshes once
+    (single-flight, in-process) and retries. Latency is recorded under `op`
+    (e.g. "qb.invoice.update"). Writes made while handling an Idempotency-Key
+    carry a matching `requestid`, so QuickBooks de-duplicates them too.
+    """
+    op = op or _default_op(url)
+    if method == "POST" and (request_id := next_qb_request_id(op, _payload_bytes(json, data))):
+        # Appended to the URL: httpx `params` would replace e.g. ?operation=update
+        url += ("&" if "?" in url else "?") + f"requestid={request_id}"
+    with metrics.upstream(op) as call:
+        token = await qb_token_manager.get_access_token(qb_access_token)
+        response = await _governed_request(method, url, token, params=params, json=json, data=data)
+
+        if response.status_code == 401:
+            print("🔴 QuickBooks 401, refreshing access token:", response.text[:200])
+            token, _ = await qb_token_manager.refresh(failed_token=token)
+            response = await _governed_request(method, url, token, params=params, json=json, data=data)
+
+        call.status = response.status_code
+    return response
+
+
+def _payload_bytes(json, data) -> bytes:
+    if json is not None:
+        return dumps(json)
+    if isinstance(data, str):
+        return data.encode()
+    return data if isinstance(data, bytes) else b""
+
+
+def _default_op(url: str) -> str:
+    # f"{QB_BASE}/{realm_id}/invoice/123/send" -> "qb.invoice"
+    parts = url[len(QB_BASE) + 1:].split("?", 1)[0].split("/")
+    return f"qb.{parts[1]}" if len(parts) > 1 else "qb.other"
+
+
+def _realm_from_url(url: str) -> str:
+    # Every API URL is built as f"{QB_BASE}/{realm_id}/..."
+    return url[len(QB_BASE) + 1:].split("/", 1)[0].split("?", 1)[0] if url.startswith(QB_BASE) else ""
+
+
+async def _governed_request(method: str, url: str, token: str | None, **kwargs) -> httpx.Response:
+    client = get_qb_client()
+    governor = get_governor(_realm_from_url(url))
+    attempt = 0
+    while True:
+        async with governor.slot():
+            response = await client.request(method, url, headers=build_qb_headers(token), **kwargs)
+        if response.status_code != 429 or attempt >= settings.QB_MAX_RETRIES:
+            return response
+        delay = retry_delay(attempt, response.headers.get("Retry-After"))
+        print(f"🟡 QuickBooks 429 for realm {governor.realm_id}, retrying in {delay:.2f}s")
+        # Hold back the whole realm, not just this request; the next
+        # slot() waits until the block lifts
+        governor.throttle(delay)
+        attempt += 1
 
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-    }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer",
-            headers=headers,
-            data=data,
-        )
+QB_PAGE_SIZE = 1000
 
-    if response.status_code != 200:
-        print("🔴 QuickBooks 400 response:", response.text)
-        raise HTTPException(status_code=500, detail=f"QuickBooks refresh failed: {response.text}")
 
-    token_data = response.json()
-    return token_data["access_token"], token_data["refresh_token"]
+async def iter_query_pages(qb_access_token: str, realm_id: str, query: str, entity: str, page_size: int = QB_PAGE_SIZE):
+    """Yield `(rows, server_time)` for each STARTPOSITION/MAXRESULTS page of `query`."""
+    start = 1
+    while True:
+        q = f"{query} STARTPOSITION {start} MAXRESULTS {page_size}"
+        url = f"{QB_BASE}/{realm_id}/query?query={quote(q)}"
+        r = await qb_request("GET", url, qb_access_token, op=f"qb.query.{entity.lower()}")
+        r.raise_for_status()
+        body = read_json(r)
+        rows = body.get("QueryResponse", {}).get(entity, []) or []
+        yield rows, body.get("time")
+        if len(rows) < page_size:
+            return
+        start += page_size
 
 
-async def search_customers(qb_access_token: str, realm_id: str) -> list[dict]:
+def _customer_query(q: str | None) -> str:
     query = "select * from Customer"
-    url = f"{QB_BASE}/{realm_id}/query?query={query}"
-    
-    print("Calling QuickBooks API:", url)
-    print("🔸 FULL ACCESS TOKEN:", qb_access_token)
-    print("Realm ID:", realm_id)
-    print("Query:", query)
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get(url, headers=build_qb_headers(qb_access_token))
-            r.raise_for_status()
-            json_resp = r.json()
-            print("QuickBooks response:", r.json())
-            return r.json().get("QueryResponse", {}).get("Customer", [])
-        
-        except httpx.HTTPStatusError as e:
-            print("QuickBooks API error:", e.response.status_code, e.response.text)
-            return []
+    if q:
+        # QuickBooks query strings escape quotes with a backslash
+        term = q.replace("\\", "\\\\").replace("'", "\\'")
+        query += f" where DisplayName LIKE '%{term}%'"
+    return query + " order by DisplayName"
+
+
+async def search_customers(
+    qb_access_token: str,
+    realm_id: str,
+    q: str | None = None,
+    start_position: int = 1,
+    max_results: int = QB_PAGE_SIZE,
+) -> list[dict]:
+    """One STARTPOSITION/MAXRESULTS page of customers, optionally filtered by display name."""
+    query = f"{_customer_query(q)} STARTPOSITION {start_position} MAXRESULTS {max_results}"
+    url = f"{QB_BASE}/{realm_id}/query?query={quote(query)}"
+    try:
+        r = await qb_request("GET", url, qb_access_token, op="qb.query.customer")
+        r.raise_for_status()
+    except httpx.HTTPStatusError as e:
+        print("QuickBooks API error:", e.response.status_code, e.response.text)
+        raise HTTPException(status_code=502, detail="QuickBooks customer query failed")
+    return read_json(r).get("QueryResponse", {}).get("Customer", []) or []
+
+
+async def iter_customer_pages(qb_access_token: str, realm_id: str, q: str | None = None, page_size: int = QB_PAGE_SIZE):
+    """Yield successive pages from search_customers; only one page is held at a time."""
+    start = 1
+    while True:
+        page = await search_customers(qb_access_token, realm_id, q, start, page_size)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+async def fetch_all_customers(qb_access_token: str, realm_id: str) -> tuple[list[dict], str]:
+    """Page through every active customer; returns the rows and QuickBooks' server time."""
+    customers: list[dict] = []
+    server_time = None
+    try:
+        async for rows, page_time in iter_query_pages(qb_access_token, realm_id, "select * from Customer", "Customer"):
+            customers.extend(rows)
+            server_time = server_time or page_time
+    except httpx.HTTPStatusError as e:
+        print("QuickBooks API error:", e.response.status_code, e.response.text)
+        raise HTTPException(status_code=502, detail="QuickBooks customer query failed")
+    return customers, server_time or _utc_now_iso()
+
+
+async def fetch_changes(
+    qb_access_token: str,
+    realm_id: str,
+    entities: list[str],
+    changed_since: str,
+    op: str = "qb.cdc",
+) -> tuple[dict[str, list[dict]], str]:
+    """ChangeDataCapture: rows of each entity created, updated or deleted since `changed_since`."""
+    url = f"{QB_BASE}/{realm_id}/cdc"
+    params = {"entities": ",".join(entities), "changedSince": changed_since}
+    r = await qb_request("GET", url, qb_access_token, params=params, op=op)
+    r.raise_for_status()
+    body = read_json(r)
+    changed: dict[str, list[dict]] = {entity: [] for entity in entities}
+    for cdc in body.get("CDCResponse", []):
+        for qr in cdc.get("QueryResponse", []):
+            for entity in entities:
+                changed[entity].extend(qr.get(entity, []) or [])
+    return changed, body.get("time") or _utc_now_iso()
+
+
+async def fetch_changed_customers(qb_access_token: str, realm_id: str, changed_since: str) -> tuple[list[dict], str]:
+    """ChangeDataCapture: customers created, updated or deleted since `changed_since`."""
+    changed, server_time = await fetch_changes(qb_access_token, realm_id, ["Customer"], changed_since, op="qb.cdc.customer")
+    return changed["Customer"], server_time
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
 async def get_customer_by_id(customer_id: str, qb_access_token: str, realm_id: str, request: Request):
     url = f"{QB_BASE}/{realm_id}/customer/{customer_id}"
-    r = await safe_qb_request("GET", url, request, headers=build_qb_headers(qb_access_token))
+    r = await safe_qb_request("GET", url, request, headers=build_qb_headers(qb_access_token), op="qb.customer.read")
     r.raise_for_status()
-    c = r.json().get("Customer", {})
+    c = read_json(r).get("Customer", {})
     return {
         "id": c.get("Id"),
         "display_name": c.get("DisplayName"),
@@ -104,10 +240,10 @@ async def create_customer(payload: dict, qb_access_token: str, realm_id: str):
     if phone := payload.get("PrimaryPhone"):
         body["PrimaryPhone"] = {"FreeFormNumber": phone}
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(url, headers=build_qb_headers(qb_access_token), json=body)
+    r = await qb_request("POST", url, qb_access_token, json=body, op="qb.customer.create")
     r.raise_for_status()
-    c = r.json().get("Customer", {})
+    c = read_json(r).get("Customer", {})
+    get_customer_directory(realm_id).upsert(c)
     return {
         "id": c.get("Id"),
         "display_name": c.get("DisplayName"),
@@ -116,6 +252,30 @@ async def create_customer(payload: dict, qb_access_token: str, realm_id: str):
     }
 
 
+def build_sales_line(item_id: str, description: str, qty: float, rate: float) -> dict:
+    return {
+        "DetailType": "SalesItemLineDetail",
+        "Amount": round(rate * qty, 2),
+        "Description": description,
+        "SalesItemLineDetail": {
+            "ItemRef": {"value": str(item_id)},
+            "Qty": qty,
+            "UnitPrice": rate
+        },
+    }
+
+
+def is_stale_sync_token(response: httpx.Response) -> bool:
+    """QuickBooks answers 400 / Fault code 5010 when the SyncToken is out of date."""
+    if response.status_code != 400:
+        return False
+    try:
+        errors = read_json(response).get("Fault", {}).get("Error", [])
+    except ValueError:
+        return False
+    return any(str(e.get("code")) == "5010" for e in errors)
+
+
 async def create_today_invoice(
     customer_id: str,
     qb_access_token: str,
@@ -129,118 +289,182 @@ async def create_today_invoice(
     create_url = f"{QB_BASE}/{realm_id}/invoice"
 
     payload = {
-        "Line": [
-            {
-                "DetailType": "SalesItemLineDetail",
-                "Amount": round(rate * qty, 2),
-                "Description": description,
-                "SalesItemLineDetail": {
-                    "ItemRef": {"value": str(item_id)},
-                    "Qty": qty,
-                    "UnitPrice": rate
-                },
-            }
-        ],
+        "Line": [build_sales_line(item_id, description, qty, rate)],
         "CustomerRef": {"value": str(customer_id)},
         "TxnDate": today,
     }
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(
-            create_url,
-            headers=build_qb_headers(qb_access_token),
-            json=payload
-        )
+    r = await qb_request("POST", create_url, qb_access_token, json=payload, op="qb.invoice.create")
     r.raise_for_status()
 
-    inv = r.json().get("Invoice", {})
+    inv = read_json(r).get("Invoice", {})
+    invoice_state.remember_invoice(realm_id, inv)
     return {"Id": inv.get("Id"), "DocNumber": inv.get("DocNumber")}
 
 
-async def get_today_invoice_only(customer_id: str, qb_access_token: str, realm_id: str):
+def today_invoice_query(customer_id: str) -> str:
+    # `select *` returns the full invoice (Line, SyncToken) in the same round trip
     today = date.today().isoformat()
-    q = (
-        "select Id, DocNumber, TxnDate, TotalAmt, Balance from Invoice "
+    return (
+        "select * from Invoice "
         f"where TxnDate = '{today}' "
         f"and CustomerRef = '{customer_id}' "
-        "order by MetaData.CreateTime desc"
+        "order by MetaData.CreateTime desc MAXRESULTS 1"
     )
-    query_url = f"{QB_BASE}/{realm_id}/query?query={quote(q)}"
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(query_url, headers=build_qb_headers(qb_access_token))
+
+async def warm_invoice_index(qb_access_token: str, realm_id: str):
+    """Load all of today's invoices for the realm with one paginated query, so
+    per-customer lookups are answered from invoice_state. Failures are logged
+    and leave the realm cold; lookups then fall back to per-customer queries."""
+    ttl = settings.QB_INVOICE_INDEX_TTL_SECONDS
+    if invoice_state.is_warm(realm_id, ttl):
+        return
+    async with invoice_state.warm_lock(realm_id):
+        if invoice_state.is_warm(realm_id, ttl):
+            return
+        today = date.today().isoformat()
+        query = f"select * from Invoice where TxnDate = '{today}' order by MetaData.CreateTime"
+        invoices: list[dict] = []
+        try:
+            async for rows, _ in iter_query_pages(qb_access_token, realm_id, query, "Invoice"):
+                invoices.extend(rows)
+        except httpx.HTTPError as e:
+            print("⚠️ Could not load today's invoices:", e)
+            return
+        invoice_state.load_day(realm_id, today, invoices)
+        print(f"📇 Indexed {len(invoices)} invoices for {today}")
+
+
+async def get_today_invoice_only(customer_id: str, qb_access_token: str, realm_id: str):
+    await warm_invoice_index(qb_access_token, realm_id)
+    known, cached = invoice_state.lookup_today_invoice(realm_id, customer_id, settings.QB_INVOICE_INDEX_TTL_SECONDS)
+    metrics.record_cache("invoice_state", known)
+    if cached:
+        return cached
+    if known:
+        return { "Id": None }
+
+    query_url = f"{QB_BASE}/{realm_id}/query?query={quote(today_invoice_query(customer_id))}"
+
+    r = await qb_request("GET", query_url, qb_access_token, op="qb.query.invoice")
     r.raise_for_status()
-    invoices = r.json().get("QueryResponse", {}).get("Invoice", []) or []
+    invoices = read_json(r).get("QueryResponse", {}).get("Invoice", []) or []
     if invoices:
-        invoice_id = invoices[0]["Id"]
-        get_url = f"{QB_BASE}/{realm_id}/invoice/{invoice_id}"
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            r = await client.get(get_url, headers=build_qb_headers(qb_access_token))
-        r.raise_for_status()
-        return r.json().get("Invoice", {})
+        invoice_state.remember_invoice(realm_id, invoices[0])
+        return invoices[0]
 
     return { "Id": None }
 
 
-async def append_invoice_line(invoice_id: str, description: str, qty: float, rate: float, item_id: str, qb_access_token: str, realm_id: str):
+async def get_invoice(invoice_id: str, qb_access_token: str, realm_id: str) -> dict:
     get_url = f"{QB_BASE}/{realm_id}/invoice/{invoice_id}"
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(get_url, headers=build_qb_headers(qb_access_token))
+    r = await qb_request("GET", get_url, qb_access_token, op="qb.invoice.read")
     r.raise_for_status()
-    inv = r.json().get("Invoice", {})
-    sync_token = inv.get("SyncToken", "0")
+    inv = read_json(r).get("Invoice", {})
+    invoice_state.remember_invoice(realm_id, inv)
+    return inv
+
 
+async def update_invoice_lines(invoice_id: str, new_lines: list[dict], qb_access_token: str, realm_id: str) -> dict:
+    """Append `new_lines` with one sparse update, using the cached SyncToken/Line
+    when we have them and refetching once if QuickBooks reports them stale."""
     update_url = f"{QB_BASE}/{realm_id}/invoice?operation=update"
-    new_line = {
-        "DetailType": "SalesItemLineDetail",
-        "Description": description,
-        "Amount": round(qty * rate, 2),
-        "SalesItemLineDetail": {
-            "ItemRef": {"value": item_id},
-            "Qty": qty,
-            "UnitPrice": rate
+
+    inv = invoice_state.get_invoice(realm_id, invoice_id)
+    for attempt in range(2):
+        if inv is None:
+            inv = await get_invoice(invoice_id, qb_access_token, realm_id)
+
+        payload = {
+            "Id": invoice_id,
+            "SyncToken": inv.get("SyncToken", "0"),
+            "Line": (inv.get("Line") or []) + new_lines,
+            "sparse": True
         }
-    }
-    payload = {
-        "Id": invoice_id,
-        "SyncToken": sync_token,
-        "Line": (inv.get("Line") or []) + [new_line],
-        "sparse": True
-    }
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(update_url, headers=build_qb_headers(qb_access_token), json=payload)
+        r = await qb_request("POST", update_url, qb_access_token, json=payload, op="qb.invoice.update")
+        if attempt == 0 and is_stale_sync_token(r):
+            invoice_state.forget_invoice(realm_id, invoice_id)
+            inv = None
+            continue
+        break
+
     r.raise_for_status()
-    updated = r.json().get("Invoice", {})
+    updated = read_json(r).get("Invoice", {})
+    invoice_state.remember_invoice(realm_id, updated)
+    return updated
+
+
+async def append_invoice_line(invoice_id: str, description: str, qty: float, rate: float, item_id: str, qb_access_token: str, realm_id: str):
+    new_line = build_sales_line(item_id, description, qty, rate)
+
+    async def flush(lines: list[dict]) -> dict:
+        return await update_invoice_lines(invoice_id, lines, qb_access_token, realm_id)
+
+    updated = await submit_lines(
+        (realm_id, invoice_id),
+        [new_line],
+        flush,
+        window=settings.QB_INVOICE_COALESCE_WINDOW_MS / 1000,
+        # A keyed request's line must go out under its own requestid
+        exclusive=in_keyed_request(),
+    )
     return {"Id": updated.get("Id"), "DocNumber": updated.get("DocNumber")}
 
 
 async def send_invoice_email(invoice_id: str, qb_access_token: str, realm_id: str):
     url = f"{QB_BASE}/{realm_id}/invoice/{invoice_id}/send"
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.post(url, headers=build_qb_headers(qb_access_token))
+    r = await qb_request("POST", url, qb_access_token, op="qb.invoice.send")
     r.raise_for_status()
-    return r.json()
+    body = read_json(r)
+    # Sending bumps the invoice's SyncToken; keep our copy current
+    if inv := body.get("Invoice"):
+        invoice_state.remember_invoice(realm_id, inv)
+    return body
 
 
 async def get_all_qb_items(qb_access_token: str, realm_id: str, request: Request):
-    q = "select Id, Name from Item"
-    url = f"{QB_BASE}/{realm_id}/query?query={quote(q)}"
-    r = await safe_qb_request("GET", url, request, headers=build_qb_headers(qb_access_token))
-    r.raise_for_status()
-    return r.json().get("QueryResponse", {}).get("Item", [])
+    """Every item, paged through STARTPOSITION/MAXRESULTS like the customer list."""
+    qb_token_manager.seed(request.cookies.get("qb_refresh_token"))
+    items: list[dict] = []
+    async for rows, _ in iter_query_pages(qb_access_token, realm_id, "select Id, Name from Item", "Item"):
+        items.extend(rows)
+    return items
+
+
+async def load_item_catalog(qb_access_token: str, realm_id: str, request: Request, force: bool = False) -> ItemCatalog:
+    catalog = get_item_catalog(realm_id)
+    if not force and catalog.is_fresh(settings.QB_ITEM_CATALOG_TTL_SECONDS):
+        return catalog
+
+    requested_at = time.monotonic()
+    async with catalog.lock:
+        # A forced reload that finished while we waited for the lock serves us too
+        reloaded = catalog.loaded_at is not None and catalog.loaded_at >= requested_at
+        if (force and not reloaded) or not catalog.is_fresh(settings.QB_ITEM_CATALOG_TTL_SECONDS):
+            catalog.load(await get_all_qb_items(qb_access_token, realm_id, request))
+    return catalog
+
+
+async def resolve_item_id(name: str, qb_access_token: str, realm_id: str, request: Request) -> str | None:
+    catalog = await load_item_catalog(qb_access_token, realm_id, request)
+    item_id = catalog.find_id(name)
+    metrics.record_cache("item_catalog", item_id is not None)
+    if item_id is None and not catalog.is_fresh(settings.QB_ITEM_MISS_RELOAD_SECONDS):
+        # The item may have been added in QuickBooks since the catalog was
+        # loaded; a catalog loaded within the cooldown is trusted, so unknown
+        # names don't each cost a full item download
+        catalog = await load_item_catalog(qb_access_token, realm_id, request, force=True)
+        item_id = catalog.find_id(name)
+    return item_id
 
 
 async def get_item_id_by_name(name: str, request: Request) -> str:
     qb_access_token, realm_id = get_tokens_and_realm_id(request)
-    q = f"select Id, Name from Item where Name = '{name}'"
-    url = f"{QB_BASE}/{realm_id}/query?query={quote(q)}"
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(url, headers=build_qb_headers(qb_access_token))
-    r.raise_for_status()
-    items = r.json().get("QueryResponse", {}).get("Item", [])
-    if not items:
+    item_id = await resolve_item_id(name, qb_access_token, realm_id, request)
+    if not item_id:
         raise ValueError(f"QuickBooks item '{name}' not found.")
-    return items[0]["Id"]
+    return item_id
 
 
 async def get_all_invoices_for_customer(customer_id: str, qb_access_token: str, realm_id: str):
@@ -251,52 +475,33 @@ async def get_all_invoices_for_customer(customer_id: str, qb_access_token: str,
     )
     query_url = f"{QB_BASE}/{realm_id}/query?query={quote(q)}"
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        r = await client.get(query_url, headers=build_qb_headers(qb_access_token))
+    r = await qb_request("GET", query_url, qb_access_token, op="qb.query.invoice")
     r.raise_for_status()
 
+    body = read_json(r)
     print("📄 QuickBooks all invoices query:", q)
-    print("📄 Response:", r.json())
+    print("📄 Response:", body)
 
-    return r.json().get("QueryResponse", {}).get("Invoice", [])
+    return body.get("QueryResponse", {}).get("Invoice", [])
 
 
 async def safe_qb_request(
     method: str,
     url: str,
-    request: Request,
+    request: Request | None = None,
     headers: dict = None,
     data=None,
     json=None,
-    params=None
+    params=None,
+    op: str | None = None,
 ):
-    if headers is None:
-        headers = {}
-
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        response = await client.request(method, url, headers=headers, data=data, json=json, params=params)
-
-        # Success — return response
-        if response.status_code < 400:
-            return response
-
-        # Handle token expiration
-        if response.status_code == 401:
-            error = response.json().get("error_description", "")
-            print("🔴 QuickBooks error:", error)
-
-            if "token expired" in error.lower():
-                # access token expired → refresh and retry
-                await client.get("http://localhost:8000/api/qb-auth/refresh-token", cookies=request.cookies)
-                response = await client.request(method, url, headers=headers, data=data, json=json, params=params)
-                if response.status_code < 400:
-                    return response
-
-            elif "invalid grant" in error.lower():
-                raise HTTPException(
-                    status_code=401,
-                    detail="QuickBooks refresh token is invalid or expired. Please reconnect via /connect-to-qb."
-                )
-
-        # Still bad? Raise it
-        response.raise_for_status()
\ No newline at end of file
+    qb_access_token = None
+    if headers and headers.get("Authorization", "").startswith("Bearer "):
+        qb_access_token = headers["Authorization"][len("Bearer "):]
+    if request is not None:
+        qb_access_token = qb_access_token or request.cookies.get("qb_access_token")
+        qb_token_manager.seed(request.cookies.get("qb_refresh_token"))
+
+    response = await qb_request(method, url, qb_access_token, params=params, json=json, data=data, op=op)
+    response.raise_for_status()
+    return response
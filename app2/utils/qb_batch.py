@@ -0,0 +1,98 @@
+# app2/utils/qb_batch.py
+
+import asyncio
+import httpx
+from utils.qb import QB_BASE, qb_request
+from utils.codec import read_json
+
+# QuickBooks accepts at most 30 operations per /batch request
+QB_BATCH_LIMIT = 30
+
+
+class BatchFault(Exception):
+    def __init__(self, fault: dict):
+        self.fault = fault
+        errors = fault.get("Error", []) or [{}]
+        self.code = str(errors[0].get("code", ""))
+        super().__init__(errors[0].get("Detail") or errors[0].get("Message") or fault.get("type", "Batch fault"))
+
+
+class BatchOperation:
+    def __init__(self, bid: str, request: dict, entity: str | None):
+        self.bid = bid
+        self.request = request
+        self.entity = entity
+        self.response: dict | None = None
+        self.fault: dict | None = None
+
+    def result(self):
+        """The created/updated entity, or the QueryResponse for queries."""
+        if self.fault is not None:
+            raise BatchFault(self.fault)
+        if self.response is None:
+            raise BatchFault({"type": "MissingResponse", "Error": [{"Message": f"No response for bId {self.bid}"}]})
+        if self.entity is None:
+            return self.response.get("QueryResponse", {})
+        return self.response.get(self.entity, {})
+
+
+class QBBatch:
+    """Collects create/update/query operations and runs them through /batch.
+
+    Operations are chunked to QB_BATCH_LIMIT per request; per-item results
+    and faults are mapped back onto the BatchOperation handles.
+    """
+
+    def __init__(self, qb_access_token: str, realm_id: str):
+        self.qb_access_token = qb_access_token
+        self.realm_id = realm_id
+        self.operations: list[BatchOperation] = []
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def _add(self, request: dict, entity: str | None) -> BatchOperation:
+        op = BatchOperation(str(len(self.operations) + 1), request, entity)
+        op.request["bId"] = op.bid
+        self.operations.append(op)
+        return op
+
+    def create(self, entity: str, body: dict) -> BatchOperation:
+        return self._add({"operation": "create", entity: body}, entity)
+
+    def update(self, entity: str, body: dict) -> BatchOperation:
+        return self._add({"operation": "update", entity: body}, entity)
+
+    def query(self, q: str) -> BatchOperation:
+        return self._add({"Query": q}, None)
+
+    async def execute(self) -> list[BatchOperation]:
+        chunks = [
+            self.operations[i:i + QB_BATCH_LIMIT]
+            for i in range(0, len(self.operations), QB_BATCH_LIMIT)
+        ]
+        await asyncio.gather(*(self._execute_chunk(chunk) for chunk in chunks))
+        return self.operations
+
+    async def _execute_chunk(self, chunk: list[BatchOperation]):
+        url = f"{QB_BASE}/{self.realm_id}/batch"
+        body = {"BatchItemRequest": [op.request for op in chunk]}
+        try:
+            r = await qb_request("POST", url, self.qb_access_token, json=body, op="qb.batch")
+            r.raise_for_status()
+        except httpx.HTTPError as e:
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            fault = {"type": "BatchRequestFailed", "Error": [{"code": str(status or ""), "Message": str(e)}]}
+            for op in chunk:
+                op.fault = fault
+            return
+
+        by_bid = {op.bid: op for op in chunk}
+        for item in read_json(r).get("BatchItemResponse", []):
+            op = by_bid.get(str(item.get("bId")))
+            if op is None:
+                continue
+            if "Fault" in item:
+                op.fault = item["Fault"]
+            else:
+                op.response = item
@@ -0,0 +1,137 @@
+# app2/utils/qb_token_manager.py
+
+import asyncio
+import base64
+import os
+import time
+from fastapi import HTTPException
+from config import settings
+from utils.cache import TTLCache
+from utils.http_clients import get_qb_oauth_client
+from utils.codec import read_json
+from utils import metrics
+
+QB_TOKEN_URL = settings.QB_OAUTH_URL or "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer"
+
+
+class QBTokenManager:
+    """In-process owner of the QuickBooks OAuth token pair.
+
+    Tracks when the access token expires and refreshes it ahead of time.
+    Refreshes are single-flight: however many requests hit a 401 at once,
+    exactly one call goes to Intuit and every waiter gets its result.
+    Access tokens we have replaced are remembered, so a request still carrying
+    an old token (e.g. from a cookie) is switched to the current one instead of
+    triggering another refresh.
+    """
+
+    def __init__(self, margin: float):
+        self.margin = margin
+        self.access_token: str | None = None
+        self.refresh_token: str | None = None
+        self.expires_at: float = 0.0
+        self.refresh_count = 0
+        self._inflight: asyncio.Future | None = None
+        # old access token -> the token that replaced it
+        self._superseded = TTLCache(maxsize=256, ttl=60 * 60)
+
+    def seed(self, refresh_token: str | None):
+        """Adopt a refresh token (env, cookie) if we don't already hold one."""
+        if refresh_token and not self.refresh_token:
+            self.refresh_token = refresh_token
+
+    def expiring(self) -> bool:
+        return self.access_token is None or time.monotonic() >= self.expires_at - self.margin
+
+    def resolve(self, access_token: str | None) -> str | None:
+        """Map a possibly-superseded access token onto the current one."""
+        if access_token and access_token != self.access_token:
+            return self._superseded.get(access_token, access_token, count=False)
+        return access_token or self.access_token
+
+    async def get_access_token(self, access_token: str | None = None) -> str | None:
+        token = self.resolve(access_token)
+        # Proactively refresh the token we manage before it lapses
+        if token and token == self.access_token and self.expiring() and self.refresh_token:
+            token, _ = await self.refresh()
+        return token
+
+    async def ensure_valid(self) -> tuple[str, str]:
+        if self.expiring():
+            return await self.refresh()
+        return self.access_token, self.refresh_token
+
+    async def refresh(self, failed_token: str | None = None, refresh_token: str | None = None) -> tuple[str, str]:
+        # Someone already refreshed past the token that just failed
+        if failed_token and self.access_token and failed_token != self.access_token and not self.expiring():
+            return self.access_token, self.refresh_token
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh(refresh_token or self.refresh_token))
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future: asyncio.Future):
+        self._inflight = None
+        if not future.cancelled():
+            # Avoid "exception was never retrieved" when no waiter is left
+            future.exception()
+
+    async def _refresh(self, refresh_token: str | None) -> tuple[str, str]:
+        self.seed(os.getenv("QB_REFRESH_TOKEN"))
+        refresh_token = refresh_token or self.refresh_token
+        if not refresh_token:
+            raise HTTPException(status_code=401, detail="Missing QuickBooks refresh token. Please reconnect via /connect-to-qb.")
+
+        token_data = await self.request_tokens({
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        })
+        self.refresh_count += 1
+        return self.store(token_data)
+
+    async def exchange_code(self, code: str, redirect_uri: str) -> tuple[str, str]:
+        token_data = await self.request_tokens({
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": redirect_uri,
+        })
+        return self.store(token_data)
+
+    def store(self, token_data: dict) -> tuple[str, str]:
+        if self.access_token and self.access_token != token_data["access_token"]:
+            self._superseded.set(self.access_token, token_data["access_token"])
+        self.access_token = token_data["access_token"]
+        self.refresh_token = token_data.get("refresh_token") or self.refresh_token
+        self.expires_at = time.monotonic() + float(token_data.get("expires_in", 3600))
+        return self.access_token, self.refresh_token
+
+    async def request_tokens(self, data: dict) -> dict:
+        client_id = os.getenv("QB_CLIENT_ID")
+        client_secret = os.getenv("QB_CLIENT_SECRET")
+        if not client_id or not client_secret:
+            raise HTTPException(status_code=500, detail="Missing QuickBooks credentials")
+
+        auth = f"{client_id}:{client_secret}".encode()
+        headers = {
+            "Authorization": f"Basic {base64.b64encode(auth).decode()}",
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Accept": "application/json",
+        }
+        with metrics.upstream("qb.oauth.token") as call:
+            response = await get_qb_oauth_client().post(QB_TOKEN_URL, headers=headers, data=data)
+            call.status = response.status_code
+
+        if response.status_code != 200:
+            print("🔴 QuickBooks token response:", response.status_code, response.text)
+            if "invalid_grant" in response.text:
+                raise HTTPException(
+                    status_code=401,
+                    detail="QuickBooks refresh token is invalid or expired. Please reconnect via /connect-to-qb."
+                )
+            raise HTTPException(status_code=500, detail=f"QuickBooks token request failed: {response.text}")
+
+        return read_json(response)
+
+
+qb_token_manager = QBTokenManager(margin=settings.QB_TOKEN_REFRESH_MARGIN_SECONDS)
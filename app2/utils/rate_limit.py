@@ -0,0 +1,117 @@
+# app2/utils/rate_limit.py
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from config import settings
+
+# Intuit enforces per-realm limits on request rate and on concurrent requests.
+# Every outbound QuickBooks call takes a token from the realm's bucket and a
+# slot in its semaphore, so bursts queue here instead of turning into 429s.
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        # asyncio.Lock wakes waiters in FIFO order, which keeps the bucket fair
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def block(self, seconds: float):
+        """Stop handing out tokens for `seconds` (after a 429 / Retry-After)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class RealmGovernor:
+    def __init__(self, realm_id: str):
+        self.realm_id = realm_id
+        self.bucket = TokenBucket(settings.QB_RATE_LIMIT_PER_MINUTE)
+        self.semaphore = asyncio.Semaphore(settings.QB_MAX_CONCURRENT_REQUESTS)
+        self.waiting = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self.bucket.acquire()
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            yield waited
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def throttle(self, retry_after: float):
+        self.throttled += 1
+        self.bucket.block(retry_after)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "wait_seconds_total": round(self.wait_seconds_total, 4),
+            "wait_seconds_max": round(self.wait_seconds_max, 4),
+        }
+
+
+_governors: dict[str, RealmGovernor] = {}
+
+
+def get_governor(realm_id: str) -> RealmGovernor:
+    governor = _governors.get(realm_id)
+    if governor is None:
+        governor = _governors[realm_id] = RealmGovernor(realm_id)
+    return governor
+
+
+def governor_stats() -> dict[str, dict]:
+    return {realm_id: governor.stats() for realm_id, governor in _governors.items()}
+
+
+def retry_delay(attempt: int, retry_after: str | None) -> float:
+    """Seconds to wait before retry `attempt` (0-based): Retry-After if the
+    server sent one, else exponential backoff, both with jitter."""
+    try:
+        base = float(retry_after) if retry_after else None
+    except ValueError:
+        base = None
+    if base is None:
+        base = settings.QB_BACKOFF_BASE_SECONDS * (2 ** attempt)
+    return base + random.uniform(0, base / 2)
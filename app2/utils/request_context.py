@@ -0,0 +1,80 @@
+# app2/utils/request_context.py
+
+from fastapi import HTTPException, Request
+from starlette.requests import cookie_parser
+from utils.session import customer_key, session_store
+from utils.qb_token_manager import qb_token_manager
+
+_UNSET = object()
+
+
+class RequestContext:
+    """Per-request view of who is calling and against which QuickBooks realm.
+
+    Built once from the cookies by RequestContextMiddleware; the selected
+    customer is read from the session store only when first needed.
+    """
+
+    def __init__(self, cookies: dict[str, str], session_header: str = ""):
+        self.jwt_token = cookies.get("jwt_token")
+        self.qb_access_token = cookies.get("qb_access_token") or ""
+        self.qb_refresh_token = cookies.get("qb_refresh_token") or ""
+        self.realm_id = cookies.get("qb_realm_id") or ""
+        self.session_id = cookies.get("session_id") or session_header
+        # Filled in by get_current_user once the JWT has been verified
+        self.user: dict | None = None
+        self._customer_id = _UNSET
+
+    @property
+    def has_qb_credentials(self) -> bool:
+        return bool(self.qb_access_token and self.realm_id)
+
+    async def get_customer_id(self) -> str | None:
+        if self._customer_id is _UNSET:
+            self._customer_id = await session_store.aget(customer_key(self.session_id))
+        return self._customer_id
+
+    async def set_customer(self, customer_id: str):
+        await session_store.aset(customer_key(self.session_id), customer_id)
+        self._customer_id = customer_id
+
+    async def reset_customer(self):
+        await session_store.apop(customer_key(self.session_id), None)
+        self._customer_id = None
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware: parses the cookies once and stores a
+    RequestContext in scope["state"] for handlers and dependencies."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            cookie_header = ""
+            session_header = ""
+            for name, value in scope["headers"]:
+                if name == b"cookie":
+                    cookie_header = value.decode("latin-1")
+                elif name == b"x-session-id":
+                    session_header = value.decode("latin-1")
+            scope.setdefault("state", {})["ctx"] = RequestContext(cookie_parser(cookie_header), session_header)
+        await self.app(scope, receive, send)
+
+
+def get_request_context(request: Request) -> RequestContext:
+    ctx = getattr(request.state, "ctx", None)
+    if ctx is None:
+        # Middleware not installed (e.g. a bare router); build it here instead
+        ctx = RequestContext(request.cookies, request.headers.get("X-Session-Id", ""))
+        request.state.ctx = ctx
+    return ctx
+
+
+def require_qb_context(request: Request) -> RequestContext:
+    ctx = get_request_context(request)
+    if not ctx.has_qb_credentials:
+        raise HTTPException(status_code=401, detail="Missing QuickBooks credentials")
+    qb_token_manager.seed(ctx.qb_refresh_token)
+    return ctx
@@ -1,27 +1,202 @@
 # app2/utils/session.py
 
-from fastapi import Request
+import asyncio
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from fastapi import HTTPException, Request
+from config import settings
+from utils.cache import TTLCache
 
-# In-memory session store (non-persistent)
+# Session store keyed by "<session_id>:<field>"
 # Example: {"abc123:qb_customer": "456", "xyz789:qb_customer": "789"}
-session_store: dict[str, str] = {}
+# Entries expire SESSION_TTL_SECONDS after they were last written.
+# Request handlers use the async aget/aset/apop, which keep a store that does
+# blocking I/O (SQLite) off the event loop.
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    def set(self, key: str, value: str): ...
+
+    @abstractmethod
+    def pop(self, key: str, default: str | None = None) -> str | None: ...
+
+    def close(self):
+        pass
+
+    async def aget(self, key: str) -> str | None:
+        return self.get(key)
+
+    async def aset(self, key: str, value: str):
+        self.set(key, value)
+
+    async def apop(self, key: str, default: str | None = None) -> str | None:
+        return self.pop(key, default)
+
+    # Dict-style access, as when session_store was a plain dict
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: str):
+        self.set(key, value)
+
+    def __delitem__(self, key: str):
+        self.pop(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store, bounded to `maxsize` entries (least recently used go first)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._data = TTLCache(maxsize, ttl=ttl)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> str | None:
+        return self._data.get(key)
+
+    def set(self, key: str, value: str):
+        self._data.set(key, value)
+
+    def pop(self, key: str, default: str | None = None) -> str | None:
+        return self._data.pop(key, default)
+
+
+class SqliteSessionStore(SessionStore):
+    """Store in a SQLite file (WAL mode) shared by every worker process on the host.
+
+    The async methods run each call in a worker thread. A write that finds the
+    file locked by another process waits up to BUSY_TIMEOUT, and a call that
+    still hits "database is locked" is retried a few times before the request
+    is answered with 503.
+    """
+
+    # Expired rows are swept on every Nth write
+    PURGE_EVERY = 500
+    # Seconds SQLite waits on another process's write lock
+    BUSY_TIMEOUT = 5.0
+    LOCKED_RETRIES = 3
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._writes = 0
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=self.BUSY_TIMEOUT)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def _run(self, fn):
+        for attempt in range(self.LOCKED_RETRIES):
+            try:
+                with self._db_lock:
+                    return fn(self._conn())
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                print(f"⚠️ Session store busy (attempt {attempt + 1}):", e)
+                time.sleep(0.05 * (attempt + 1))
+        raise HTTPException(status_code=503, detail="Session store is busy, try again")
+
+    def __len__(self) -> int:
+        return self._run(lambda db: db.execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0])
+
+    def get(self, key: str) -> str | None:
+        row = self._run(lambda db: db.execute(
+            "SELECT value FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone())
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        def write(db: sqlite3.Connection):
+            now = time.time()
+            db.execute(
+                "INSERT OR REPLACE INTO sessions (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, now + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+        self._run(write)
+
+    def pop(self, key: str, default: str | None = None) -> str | None:
+        def take(db: sqlite3.Connection):
+            row = db.execute(
+                "SELECT value FROM sessions WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            db.execute("DELETE FROM sessions WHERE key = ?", (key,))
+            return row
+
+        row = self._run(take)
+        return row[0] if row else default
+
+    async def aget(self, key: str) -> str | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+    async def apop(self, key: str, default: str | None = None) -> str | None:
+        return await asyncio.to_thread(self.pop, key, default)
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def create_session_store() -> SessionStore:
+    if settings.SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore(settings.SESSION_DB_PATH, ttl=settings.SESSION_TTL_SECONDS)
+    if settings.SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND '{settings.SESSION_BACKEND}'")
+    return MemorySessionStore(settings.SESSION_MAX_ENTRIES, ttl=settings.SESSION_TTL_SECONDS)
+
+
+session_store: SessionStore = create_session_store()
+
+def customer_key(session_id: str) -> str:
+    return f"{session_id}:qb_customer"
 
 def get_session_id(request: Request) -> str:
     return request.cookies.get("session_id") or request.headers.get("X-Session-Id", "")
 
-def set_current_qb_customer(customer_id: str, request: Request):
-    session_id = get_session_id(request)
-    session_store[f"{session_id}:qb_customer"] = customer_id
+async def set_current_qb_customer(customer_id: str, request: Request):
+    await session_store.aset(customer_key(get_session_id(request)), customer_id)
 
-def get_current_qb_customer(request: Request) -> str | None:
-    session_id = get_session_id(request)
-    return session_store.get(f"{session_id}:qb_customer")
+async def get_current_qb_customer(request: Request) -> str | None:
+    return await session_store.aget(customer_key(get_session_id(request)))
 
-def reset_qb_customer(request: Request):
-    session_id = get_session_id(request)
-    session_store.pop(f"{session_id}:qb_customer", None)
+async def reset_qb_customer(request: Request):
+    await session_store.apop(customer_key(get_session_id(request)), None)
     
 def get_tokens_and_realm_id(request: Request) -> tuple[str, str]:
     qb_access_token = request.cookies.get("qb_access_token") or ""
     realm_id = request.cookies.get("qb_realm_id") or ""
-    return qb_access_token, realm_id
\ No newline at end of file
+    return qb_access_token, realm_id
@@ -0,0 +1,213 @@
+# app2/utils/static_files.py
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from pathlib import Path
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Serves the built SPA. Compressible files get .gz and .br siblings written
+# next to them (no .br if brotli is missing from the install), either at
+# build time via `python -m utils.static_files static/dist` or on startup;
+# requests are answered with the best variant the client accepts. Vite puts a content
+# hash in every asset name, so those are cached forever; index.html is
+# kept in memory and revalidated by ETag.
+#
+# Files go out through the ASGI `http.response.pathsend` extension (the
+# server sends the file itself, with sendfile where it can) when the server
+# offers it, e.g. granian; uvicorn does not, and there Starlette streams the
+# file in chunks.
+
+COMPRESSIBLE_SUFFIXES = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".ico", ".wasm"}
+MIN_COMPRESS_SIZE = 1024
+HASHED_NAME = re.compile(r"[-.][0-9a-f]{8,}\.\w+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+SHORT_CACHE = "public, max-age=3600"
+REVALIDATE = "no-cache"
+
+# Preferred order when the client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(data: bytes, encoding: str, brotli_quality: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress(directory: Path, brotli_quality: int = 11) -> int:
+    """Write .gz/.br siblings for compressible files that lack an up-to-date one.
+
+    Variants that don't save at least 10% are skipped. Returns the number written.
+    """
+    written = 0
+    encodings = [(enc, suffix) for enc, suffix in ENCODINGS if enc != "br" or brotli is not None]
+    for path in directory.rglob("*"):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        stat = path.stat()
+        if stat.st_size < MIN_COMPRESS_SIZE:
+            continue
+        data = None
+        for encoding, suffix in encodings:
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+                continue
+            data = data if data is not None else path.read_bytes()
+            compressed = _compress(data, encoding, brotli_quality)
+            if len(compressed) > len(data) * 0.9:
+                continue
+            target.write_bytes(compressed)
+            written += 1
+    return written
+
+
+class PathSendFileResponse(FileResponse):
+    """FileResponse that hands whole-file GETs to the server via pathsend."""
+
+    async def __call__(self, scope, receive, send):
+        if (
+            "http.response.pathsend" not in scope.get("extensions", {})
+            or scope["method"].upper() == "HEAD"
+            or any(name == b"range" for name, _ in scope["headers"])
+        ):
+            await super().__call__(scope, receive, send)
+            return
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": "http.response.pathsend", "path": str(self.path)})
+        if self.background is not None:
+            await self.background()
+
+
+def _accepted_encodings(request: Request) -> set[str]:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+class StaticAsset:
+    def __init__(self, path: Path, cache_control: str):
+        stat = path.stat()
+        self.path = path
+        self.stat = stat
+        self.media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        self.cache_control = cache_control
+        self.etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+        # encoding -> (file, stat); each encoded representation gets its own ETag
+        self.variants: dict[str, tuple[Path, os.stat_result]] = {}
+        for encoding, suffix in ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+            if variant.is_file():
+                self.variants[encoding] = (variant, variant.stat())
+
+    def etag_for(self, encoding: str | None) -> str:
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+class StaticSite:
+    """Static file + SPA index server for the built frontend in `directory`."""
+
+    def __init__(self, directory: Path, index: str = "index.html"):
+        self.directory = directory.resolve()
+        self.index_name = index
+        self.assets: dict[str, StaticAsset] = {}
+        self.index_body: dict[str, bytes] = {}
+        self.index_etag = ""
+
+    def load(self, compress: bool = True):
+        if not self.directory.is_dir():
+            print(f"⚠️ Static directory {self.directory} not found; frontend will not be served")
+            return
+        if compress:
+            try:
+                # Startup builds use a lower brotli quality; build-time runs use the max
+                written = precompress(self.directory, brotli_quality=5)
+                if written:
+                    print(f"🗜️ Precompressed {written} static files")
+            except OSError as e:
+                print("⚠️ Could not precompress static files:", e)
+
+        assets = {}
+        for path in self.directory.rglob("*"):
+            if not path.is_file() or path.suffix in (".gz", ".br"):
+                continue
+            rel = path.relative_to(self.directory).as_posix()
+            cache_control = IMMUTABLE if HASHED_NAME.search(path.name) else SHORT_CACHE
+            assets[rel] = StaticAsset(path, cache_control)
+        self.assets = assets
+
+        index_path = self.directory / self.index_name
+        if index_path.is_file():
+            body = index_path.read_bytes()
+            self.index_etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+            self.index_body = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                self.index_body["br"] = brotli.compress(body, quality=11)
+            self.assets.pop(self.index_name, None)
+
+    def index_response(self, request: Request) -> Response:
+        if not self.index_body:
+            return Response("Frontend not built", status_code=404)
+        accepted = _accepted_encodings(request)
+        chosen = next((enc for enc, _ in ENCODINGS if enc in accepted and enc in self.index_body), None)
+        etag = self.index_etag if chosen is None else f'{self.index_etag[:-1]}-{chosen}"'
+
+        headers = {"Cache-Control": REVALIDATE, "ETag": etag, "Vary": "Accept-Encoding"}
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        if chosen:
+            headers["Content-Encoding"] = chosen
+        return Response(self.index_body[chosen or "identity"], media_type="text/html", headers=headers)
+
+    def file_response(self, rel_path: str, request: Request) -> Response:
+        rel_path = rel_path.strip("/")
+        if not rel_path or rel_path == self.index_name:
+            return self.index_response(request)
+
+        asset = self.assets.get(rel_path)
+        if asset is None:
+            return Response("Not Found", status_code=404)
+
+        path, stat, chosen = asset.path, asset.stat, None
+        accepted = _accepted_encodings(request) if asset.variants else ()
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in asset.variants:
+                path, stat = asset.variants[encoding]
+                chosen = encoding
+                break
+
+        headers = {"Cache-Control": asset.cache_control, "ETag": asset.etag_for(chosen)}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if chosen:
+            headers["Content-Encoding"] = chosen
+
+        return PathSendFileResponse(path, media_type=asset.media_type, headers=headers, stat_result=stat)
+
+
+if __name__ == "__main__":
+    target = Path(sys.argv[1] if len(sys.argv) > 1 else "static/dist")
+    print(f"Precompressed {precompress(target)} files in {target}")
@@ -5,10 +5,17 @@ from config import settings
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import HTTPException
+from utils.cache import TTLCache
+import hashlib
 import secrets
+import time
 
 serializer = URLSafeTimedSerializer(settings.JWT_SECRET)
 
+# Verified JWT payloads keyed by sha256 of the token; each entry expires at
+# the token's own `exp`, so a token is signature-checked once, not per request
+_verified_tokens = TTLCache(maxsize=1024)
+
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -19,11 +26,25 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 
 
 def decode_access_token(token: str):
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _verified_tokens.get(key)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    if "exp" in payload:
+        ttl = float(payload["exp"]) - time.time()
+        if ttl > 0:
+            _verified_tokens.set(key, payload, ttl=ttl)
+    return payload
+
+
+def token_cache_stats() -> dict:
+    return {"hits": _verified_tokens.hits, "misses": _verified_tokens.misses, "size": len(_verified_tokens)}
     
 
 # CSRF Tokens
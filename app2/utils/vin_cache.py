@@ -0,0 +1,116 @@
+# app2/utils/vin_cache.py
+
+import sqlite3
+import threading
+import time
+from config import settings
+from utils.cache import TTLCache
+from utils.codec import dumps, loads
+
+# Two-tier cache for decoded VINs: a bounded in-process LRU in front of a
+# SQLite file that survives restarts. Decodes are effectively immutable, so
+# positive entries live for a long time; VINs NHTSA could not decode are
+# cached too (negative entries) but expire much sooner.
+
+
+class VinCache:
+    def __init__(self, path: str, maxsize: int, ttl: float, negative_ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = TTLCache(maxsize)
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS vin_cache ("
+                "vin TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+                "negative INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def get(self, vin: str) -> dict | None:
+        entry = self.memory.get(vin)
+        if entry is None:
+            entry = self._load(vin)
+        if entry is None:
+            self.misses += 1
+            return None
+        vehicle, negative = entry
+        if negative:
+            self.negative_hits += 1
+        return vehicle
+
+    def put(self, vin: str, vehicle: dict, negative: bool = False):
+        ttl = self.negative_ttl if negative else self.ttl
+        self.memory.set(vin, (vehicle, negative), ttl=ttl)
+        try:
+            with self._db_lock:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO vin_cache (vin, payload, negative, expires_at) VALUES (?, ?, ?, ?)",
+                    (vin, dumps(vehicle).decode(), int(negative), time.time() + ttl),
+                )
+        except sqlite3.Error as e:
+            print("🔴 VIN cache write failed:", e)
+
+    def invalidate(self, vin: str):
+        self.memory.pop(vin)
+        try:
+            with self._db_lock:
+                self._conn().execute("DELETE FROM vin_cache WHERE vin = ?", (vin,))
+        except sqlite3.Error as e:
+            print("🔴 VIN cache delete failed:", e)
+
+    def _load(self, vin: str) -> tuple[dict, bool] | None:
+        try:
+            with self._db_lock:
+                row = self._conn().execute(
+                    "SELECT payload, negative, expires_at FROM vin_cache WHERE vin = ?", (vin,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print("🔴 VIN cache read failed:", e)
+            return None
+        if row is None:
+            return None
+
+        payload, negative, expires_at = row
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return None
+
+        entry = (loads(payload), bool(negative))
+        self.disk_hits += 1
+        self.memory.set(vin, entry, ttl=remaining)
+        return entry
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "memory_size": len(self.memory),
+        }
+
+
+vin_cache = VinCache(
+    path=settings.VIN_CACHE_PATH,
+    maxsize=settings.VIN_CACHE_MAX_ENTRIES,
+    ttl=settings.VIN_CACHE_TTL_SECONDS,
+    negative_ttl=settings.VIN_CACHE_NEGATIVE_TTL_SECONDS,
+)
@@ -0,0 +1,107 @@
+# app2/utils/vin_decoder.py
+
+import csv
+from datetime import date
+from functools import lru_cache
+from pathlib import Path
+from schemas.vin_schemas import VehicleResponse
+
+# Offline decoding of what the VIN itself encodes (ISO 3779 / 49 CFR 565):
+# check digit (position 9), model year (position 10) and the World
+# Manufacturer Identifier (positions 1-3). Body and fuel still need NHTSA.
+
+WMI_TABLE_PATH = Path(__file__).resolve().parent / "data" / "wmi.csv"
+
+VIN_ALPHABET = frozenset("0123456789ABCDEFGHJKLMNPRSTUVWXYZ")
+
+_TRANSLITERATION = {
+    **{str(d): d for d in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Position 10 cycles every 30 years; index 0 is 1980 (and 2010, 2040, ...)
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+_YEAR_INDEX = {code: i for i, code in enumerate(_YEAR_CODES)}
+
+# Region of manufacture by first character, refined by the second where the
+# ISO ranges split a letter between countries.
+_COUNTRY_BY_PREFIX = {
+    "1": "UNITED STATES (USA)", "4": "UNITED STATES (USA)", "5": "UNITED STATES (USA)",
+    "2": "CANADA", "3": "MEXICO", "J": "JAPAN", "K": "SOUTH KOREA", "L": "CHINA",
+    "W": "GERMANY", "Z": "ITALY", "9": "BRAZIL",
+    "SA": "UNITED KINGDOM (UK)", "SB": "UNITED KINGDOM (UK)", "SC": "UNITED KINGDOM (UK)",
+    "SD": "UNITED KINGDOM (UK)", "SE": "UNITED KINGDOM (UK)", "SF": "UNITED KINGDOM (UK)",
+    "SG": "UNITED KINGDOM (UK)", "SH": "UNITED KINGDOM (UK)", "SJ": "UNITED KINGDOM (UK)",
+    "SK": "UNITED KINGDOM (UK)", "SL": "UNITED KINGDOM (UK)", "SM": "UNITED KINGDOM (UK)",
+    "VF": "FRANCE", "VG": "FRANCE", "VR": "FRANCE", "VS": "SPAIN",
+    "YS": "SWEDEN", "YV": "SWEDEN", "YW": "SWEDEN", "TR": "HUNGARY",
+    "TM": "CZECHIA", "TN": "CZECHIA", "MA": "INDIA", "MZ": "INDIA",
+    "ML": "THAILAND", "MM": "THAILAND", "MN": "THAILAND", "MR": "THAILAND",
+}
+
+NORTH_AMERICA = frozenset("12345")
+
+
+class InvalidVinError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1)
+def _wmi_table() -> dict[str, tuple[str, str, str]]:
+    with open(WMI_TABLE_PATH, newline="") as f:
+        return {row["wmi"]: (row["make"], row["manufacturer"], row["country"]) for row in csv.DictReader(f)}
+
+
+def compute_check_digit(vin: str) -> str:
+    total = sum(_TRANSLITERATION[c] * w for c, w in zip(vin, _WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def validate_vin(vin: str) -> str:
+    """Normalize and validate a VIN; raises InvalidVinError if it cannot be real."""
+    vin = vin.strip().upper()
+    if len(vin) != 17 or not VIN_ALPHABET.issuperset(vin):
+        raise InvalidVinError("Invalid VIN format")
+    # The check digit is only mandatory for vehicles built for North America
+    if vin[0] in NORTH_AMERICA and vin[8] != compute_check_digit(vin):
+        raise InvalidVinError("Invalid VIN check digit")
+    return vin
+
+
+def decode_model_year(vin: str, today: date | None = None) -> int | None:
+    index = _YEAR_INDEX.get(vin[9])
+    if index is None:
+        return None
+
+    latest = (today or date.today()).year + 1
+    if vin[0] in NORTH_AMERICA and vin[6].isdigit():
+        # Position 7 numeric means the 1980-2009 cycle for North American light vehicles
+        return 1980 + index
+    year = 1980 + index
+    while year + 30 <= latest:
+        year += 30
+    return year
+
+
+def lookup_country(vin: str) -> str | None:
+    return _COUNTRY_BY_PREFIX.get(vin[:2]) or _COUNTRY_BY_PREFIX.get(vin[0])
+
+
+def decode_vin_locally(vin: str) -> VehicleResponse:
+    """Partial decode from the VIN alone; body and fuel type are left empty."""
+    vin = validate_vin(vin)
+    make, manufacturer, country = _wmi_table().get(vin[:3], (None, None, None))
+    return VehicleResponse(
+        vin=vin,
+        make=make,
+        model=None,
+        year=decode_model_year(vin),
+        bodyType=None,
+        fuelType=None,
+        manufacturer=manufacturer,
+        plantCountry=country or lookup_country(vin),
+    )
@@ -52,7 +52,7 @@ const CustomerSelectModal = ({
         if (!res.ok) throw new Error("Failed to load customers");
         const data = await res.json();
         setCustomers(
-          data.map((c: any) => ({
+          data.customers.map((c: any) => ({
             id: c.Id,
             name: c.DisplayName || c.FullyQualifiedName || "Unnamed",
             email: c.PrimaryEmailAddr?.Address || "",